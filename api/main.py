@@ -1,6 +1,9 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import sys
@@ -8,17 +11,39 @@ import os
 from pathlib import Path
 import tempfile
 import json
+import logging
+import math
+import threading
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import EXCEL_PARAM_FILE
+from src.config import EXCEL_PARAM_FILE, LOG_LEVEL
 from src.llm import LLMEngine
 from src.extractors import BureauExtractor, GstExtractor
+from src.metrics import REGISTRY
+from src.profiling import ExtractionProfiler
+from src.classifier import DocumentClassifier
+from src.admission import AdmissionController, Overloaded
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load models and keep them warm for the whole life of the service, not from the first request
+    await run_in_threadpool(get_extractors)
+    llm_engine.start_heartbeat()
+    try:
+        yield
+    finally:
+        llm_engine.stop_heartbeat()
+
 
 app = FastAPI(
     title="Document Intelligence API",
     description="Extract data from Bureau Reports and GST Returns",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -32,14 +57,20 @@ app.add_middleware(
 llm_engine = None
 bureau_extractor = None
 gst_extractor = None
+# extractions run on worker threads; guards the lazy initialization below
+extractors_lock = threading.Lock()
+profiler = ExtractionProfiler()
+classifier = DocumentClassifier()
+admission = AdmissionController()
 
 def get_extractors():
     global llm_engine, bureau_extractor, gst_extractor
 
-    if llm_engine is None:
-        llm_engine = LLMEngine()
-        bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm_engine)
-        gst_extractor = GstExtractor(llm_engine)
+    with extractors_lock:
+        if llm_engine is None:
+            llm_engine = LLMEngine()
+            bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm_engine)
+            gst_extractor = GstExtractor(llm_engine, rag=bureau_extractor.rag)
 
     return bureau_extractor, gst_extractor
 
@@ -65,6 +96,7 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "extract_bureau": "/api/extract/bureau",
             "extract_gst": "/api/extract/gst",
             "extract_auto": "/api/extract/auto"
@@ -72,86 +104,154 @@ async def root():
     }
 
 
-@app.post("/api/extract/bureau", response_model=ExtractionResponse)
-async def extract_bureau(file: UploadFile = File(...)):
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
+def wants_profile(x_profile: Optional[str]) -> bool:
+    return (x_profile or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def admit(kind: str):
     try:
-        bureau_ext, _ = get_extractors()
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        return admission.admit(kind)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many {kind} extractions in progress, retry later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
 
-        try:
-            extracted_data = bureau_ext.extract(tmp_file_path)
 
-            bureau_params = {
-                k: v.model_dump() for k, v in extracted_data.items()
-            }
+async def save_upload(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        content = await file.read()
+        tmp_file.write(content)
+        return tmp_file.name
 
-            confidences = [v.confidence for v in extracted_data.values() if v.confidence > 0]
-            overall_confidence = sum(confidences) / len(confidences) if confidences else 0.0
 
-            return ExtractionResponse(
-                bureau_parameters=bureau_params,
-                overall_confidence_score=round(overall_confidence, 2),
-                status="success"
-            )
-        finally:
-            os.unlink(tmp_file_path)
+def run_bureau(tmp_file_path: str, response: Response, x_profile: Optional[str],
+               applicant: Optional[str] = None) -> ExtractionResponse:
+    bureau_ext, _ = get_extractors()
+    with profiler.profile(tmp_file_path, label="bureau", forced=wants_profile(x_profile)) as profile_dir:
+        extracted_data = bureau_ext.extract(tmp_file_path, namespace=applicant)
+    if profile_dir:
+        response.headers["X-Profile-Id"] = profile_dir.name
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+    bureau_params = {
+        k: v.model_dump() for k, v in extracted_data.items()
+    }
 
+    confidences = [v.confidence for v in extracted_data.values() if v.confidence > 0]
+    overall_confidence = sum(confidences) / len(confidences) if confidences else 0.0
 
-@app.post("/api/extract/gst", response_model=ExtractionResponse)
-async def extract_gst(file: UploadFile = File(...)):
+    return ExtractionResponse(
+        bureau_parameters=bureau_params,
+        overall_confidence_score=round(overall_confidence, 2),
+        status="success"
+    )
+
+
+def run_gst(tmp_file_path: str, response: Response, x_profile: Optional[str],
+            applicant: Optional[str] = None) -> ExtractionResponse:
+    _, gst_ext = get_extractors()
+    with profiler.profile(tmp_file_path, label="gst", forced=wants_profile(x_profile)) as profile_dir:
+        extracted_data = gst_ext.extract(tmp_file_path, namespace=applicant)
+    if profile_dir:
+        response.headers["X-Profile-Id"] = profile_dir.name
+    gst_sales = [item.model_dump() for item in extracted_data]
+    confidences = [item.confidence for item in extracted_data if item.confidence > 0]
+    overall_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+
+    return ExtractionResponse(
+        gst_sales=gst_sales,
+        overall_confidence_score=round(overall_confidence, 2),
+        status="success"
+    )
+
+
+@app.post("/api/extract/bureau", response_model=ExtractionResponse)
+async def extract_bureau(
+    response: Response,
+    file: UploadFile = File(...),
+    applicant: Optional[str] = Form(None),
+    x_profile: Optional[str] = Header(None),
+):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-    try:
-        _, gst_ext = get_extractors()
+    with admit("bureau") as ticket:
+        try:
+            tmp_file_path = await save_upload(file)
+            try:
+                return await ticket.run(run_bureau, tmp_file_path, response, x_profile, applicant)
+            finally:
+                os.unlink(tmp_file_path)
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
 
+@app.post("/api/extract/gst", response_model=ExtractionResponse)
+async def extract_gst(
+    response: Response,
+    file: UploadFile = File(...),
+    applicant: Optional[str] = Form(None),
+    x_profile: Optional[str] = Header(None),
+):
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+    with admit("gst") as ticket:
         try:
-            extracted_data = gst_ext.extract(tmp_file_path)
-            gst_sales = [item.model_dump() for item in extracted_data]
-            confidences = [item.confidence for item in extracted_data if item.confidence > 0]
-            overall_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-
-            return ExtractionResponse(
-                gst_sales=gst_sales,
-                overall_confidence_score=round(overall_confidence, 2),
-                status="success"
-            )
-        finally:
-            os.unlink(tmp_file_path)
+            tmp_file_path = await save_upload(file)
+            try:
+                return await ticket.run(run_gst, tmp_file_path, response, x_profile, applicant)
+            finally:
+                os.unlink(tmp_file_path)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
 
 @app.post("/api/extract/auto", response_model=ExtractionResponse)
-async def extract_auto(file: UploadFile = File(...)):
+async def extract_auto(
+    response: Response,
+    file: UploadFile = File(...),
+    applicant: Optional[str] = Form(None),
+    x_profile: Optional[str] = Header(None),
+):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
-    filename = file.filename.lower()
 
-    if "gst" in filename or "3b" in filename:
-        return await extract_gst(file)
-    elif "bureau" in filename or "crif" in filename or "report" in filename:
-        return await extract_bureau(file)
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Could not auto-detect document type. Please use specific endpoints."
-        )
+    with admit("auto") as ticket:
+        tmp_file_path = await save_upload(file)
+        try:
+            classification = await ticket.run(classifier.classify, tmp_file_path, filename=file.filename)
+        except BaseException:
+            os.unlink(tmp_file_path)
+            raise
+    try:
+        if classification.doc_type == "unknown":
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    "Could not auto-detect document type "
+                    f"(confidence {classification.confidence}). Please use specific endpoints."
+                )
+            )
+        response.headers["X-Document-Type"] = classification.doc_type
+        response.headers["X-Classification-Confidence"] = str(classification.confidence)
+
+        run = run_gst if classification.doc_type == "gst" else run_bureau
+        with admit(classification.doc_type) as ticket:
+            try:
+                return await ticket.run(run, tmp_file_path, response, x_profile, applicant)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+    finally:
+        os.unlink(tmp_file_path)
 
 
 if __name__ == "__main__":
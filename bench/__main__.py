@@ -0,0 +1,158 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src.config import BUREAU_REPORTS_DIR, DATA_DIR, EXCEL_PARAM_FILE, GST_RETURNS_DIR
+from src.extractors import BureauExtractor, GstExtractor
+from src.llm import LLMEngine
+
+from bench.fake_llm import FakeLLM
+from bench.stats import PAGE_CACHE_MODES, StageRecorder, isolated_page_cache, peak_rss_mb, summarize
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).resolve().parent, timeout=5,
+        )
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def collect_files(data_dir: Path, types, limit: int):
+    bureau_dir = data_dir / BUREAU_REPORTS_DIR.name
+    gst_dir = data_dir / GST_RETURNS_DIR.name
+    files = []
+    if "bureau" in types:
+        files += [(f, "bureau") for f in sorted(bureau_dir.glob("*.pdf"))]
+    if "gst" in types:
+        files += [(f, "gst") for f in sorted(gst_dir.glob("*.pdf"))]
+    return files[:limit] if limit else files
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    def ratio(new, old):
+        return round(new / old, 3) if old else None
+
+    stages = {}
+    for stage, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old:
+            stages[stage] = {"p50_ratio": ratio(stats["p50"], old["p50"]), "p90_ratio": ratio(stats["p90"], old["p90"])}
+    return {
+        "baseline_revision": baseline.get("environment", {}).get("revision"),
+        # reports from before the cache was isolated have no page_cache entry
+        "baseline_page_cache": baseline.get("config", {}).get("page_cache"),
+        "docs_per_sec_ratio": ratio(current["docs_per_sec"], baseline.get("docs_per_sec", 0)),
+        "peak_rss_ratio": ratio(current["peak_rss_mb"], baseline.get("peak_rss_mb", 0)),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline throughput benchmark over the sample corpus")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="Directory with Bureau_Reports/ and GST_3B_Returns/")
+    parser.add_argument("--types", nargs="+", choices=["bureau", "gst"], default=["bureau", "gst"])
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N documents")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM delay per call in seconds")
+    parser.add_argument("--llm-latency-per-key", type=float, default=0.0, help="Fake LLM delay per generated key in seconds")
+    parser.add_argument("--llm-mode", choices=["bulk", "grouped"], default="bulk",
+                        help="One LLM call for all parameters, or one concurrent call per parameter group")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Concurrent group calls in grouped mode")
+    parser.add_argument("--cascade-latencies", type=float, nargs="+", default=None,
+                        help="Simulate a model cascade: fake LLM delay per call for each tier, cheapest first")
+    parser.add_argument("--page-cache", choices=PAGE_CACHE_MODES, default="cold",
+                        help="Page text cache state for every pass; each pass gets its own temporary cache")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", type=Path, help="Previous report to compare against")
+    args = parser.parse_args()
+
+    files = collect_files(args.data_dir, args.types, args.limit)
+    if not files:
+        print(f"No PDFs found under {args.data_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.cascade_latencies:
+        fakes = [FakeLLM(latency=latency, latency_per_key=args.llm_latency_per_key) for latency in args.cascade_latencies]
+    else:
+        fakes = [FakeLLM(latency=args.llm_latency, latency_per_key=args.llm_latency_per_key)]
+    llm = LLMEngine(execution_mode=args.llm_mode, concurrency=args.llm_concurrency,
+                    tiers=[(f"tier{i}", fake) for i, fake in enumerate(fakes)])
+    bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm) if "bureau" in args.types else None
+    gst_extractor = GstExtractor(llm)
+
+    def run(path, dtype):
+        if dtype == "bureau":
+            bureau_extractor.extract(str(path))
+        else:
+            gst_extractor.extract(str(path))
+
+    def prime():
+        # unmeasured pass that fills the cache; its spans and LLM calls are not reported
+        calls = [fake.calls for fake in fakes]
+        recorder.paused = True
+        for path, dtype in files:
+            run(path, dtype)
+        recorder.paused = False
+        for fake, count in zip(fakes, calls):
+            fake.calls = count
+
+    per_type = {"bureau": [], "gst": []}
+    elapsed = 0.0
+    with StageRecorder() as recorder:
+        for _ in range(args.repeat):
+            # a cache per pass keeps repeats comparable instead of mixing one cold pass with warm ones
+            with isolated_page_cache(args.page_cache):
+                if args.page_cache == "warm":
+                    prime()
+                started = time.perf_counter()
+                for path, dtype in files:
+                    t0 = time.perf_counter()
+                    run(path, dtype)
+                    per_type[dtype].append(time.perf_counter() - t0)
+                elapsed += time.perf_counter() - started
+
+    documents = len(files) * args.repeat
+    report = {
+        "environment": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            "documents": len(files),
+            "repeat": args.repeat,
+            "llm_latency": args.llm_latency,
+            "llm_latency_per_key": args.llm_latency_per_key,
+            "llm_mode": args.llm_mode,
+            "llm_concurrency": args.llm_concurrency,
+            "cascade_latencies": args.cascade_latencies,
+            "page_cache": args.page_cache,
+        },
+        "documents_processed": documents,
+        "llm_calls": {f"tier{i}": fake.calls for i, fake in enumerate(fakes)},
+        "elapsed_seconds": round(elapsed, 4),
+        "docs_per_sec": round(documents / elapsed, 4) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "documents": {dtype: summarize(values) for dtype, values in per_type.items() if values},
+        "stages": recorder.report(),
+    }
+    if args.compare:
+        report["comparison"] = compare(report, json.loads(args.compare.read_text()))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
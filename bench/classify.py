@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from pypdf import PdfReader
+
+from src.classifier import DocumentClassifier
+from src.config import BUREAU_REPORTS_DIR, DATA_DIR, GST_RETURNS_DIR
+
+from bench.stats import summarize
+
+
+def legacy_route(filename: str) -> str:
+    """Filename-substring routing used before the content classifier."""
+    name = filename.lower()
+    if "gst" in name or "3b" in name:
+        return "gst"
+    if "bureau" in name or "crif" in name or "report" in name:
+        return "bureau"
+    return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing accuracy and latency of the document classifier")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    labelled = [(f, "bureau") for f in sorted((args.data_dir / BUREAU_REPORTS_DIR.name).glob("*.pdf"))]
+    labelled += [(f, "gst") for f in sorted((args.data_dir / GST_RETURNS_DIR.name).glob("*.pdf"))]
+
+    classifier = DocumentClassifier()
+    total, scoring = [], []
+    rows = []
+    for path, expected in labelled:
+        text = PdfReader(str(path)).pages[0].extract_text() or ""
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            classifier.classify_text(text)
+            scoring.append(time.perf_counter() - t0)
+        # upstream names carry no hint, so route on content alone
+        result = None
+        for _ in range(args.repeat):
+            result = classifier.classify(str(path), filename="upload.pdf")
+            total.append(result.seconds)
+        rows.append({
+            "file": path.name,
+            "expected": expected,
+            "predicted": result.doc_type,
+            "confidence": result.confidence,
+            "legacy_original_name": legacy_route(path.name),
+            "legacy_neutral_name": legacy_route("upload.pdf"),
+        })
+
+    def accuracy(key):
+        return round(sum(r[key] == r["expected"] for r in rows) / len(rows), 4) if rows else 0.0
+
+    report = {
+        "documents": len(rows),
+        "accuracy": accuracy("predicted"),
+        "legacy_accuracy_original_names": accuracy("legacy_original_name"),
+        "legacy_accuracy_neutral_names": accuracy("legacy_neutral_name"),
+        "latency_seconds": {"first_page_and_classify": summarize(total), "classify_text_only": summarize(scoring)},
+        "results": rows,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+PARAM_LINE = re.compile(r'^- "([^"]+)":', re.MULTILINE)
+GST_SALES = re.compile(r'\(a\) Outward taxable supplies.*?([\d,]+\.\d{2})', re.DOTALL)
+GST_PERIOD = re.compile(r'Period\s+(\w+)')
+GST_YEAR = re.compile(r'Year\s+(\d{4})-(\d{2})')
+
+
+class FakeLLM:
+    """Deterministic stand-in for the Ollama model used by LLMEngine.
+
+    Answers are derived from a hash of the prompt, so repeated runs over the
+    same corpus produce identical output. `latency` is a fixed delay per call
+    and `latency_per_key` adds a delay per generated JSON key, approximating
+    serial token generation.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_per_key: float = 0.0):
+        self.latency = latency
+        self.latency_per_key = latency_per_key
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        with self._lock:
+            self.calls += 1
+        if "Table 3.1" in prompt and "Outward taxable supplies" in prompt:
+            payload = self._gst_answer(prompt)
+        else:
+            payload = self._bureau_answer(prompt)
+        delay = self.latency + self.latency_per_key * len(payload)
+        if delay > 0:
+            time.sleep(delay)
+        return json.dumps(payload)
+
+    @staticmethod
+    def _bureau_answer(prompt: str) -> dict:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        answer = {}
+        for i, name in enumerate(dict.fromkeys(PARAM_LINE.findall(prompt))):
+            byte = digest[i % len(digest)]
+            lowered = name.lower()
+            if "score" in lowered:
+                answer[name] = 300 + (byte * 600) // 255
+            elif byte % 5 == 0:
+                answer[name] = None
+            elif any(w in lowered for w in ("ntc", "write-off", "suit", "wilful", "no live")):
+                answer[name] = bool(byte % 2)
+            else:
+                answer[name] = byte
+        return answer
+
+    @staticmethod
+    def _gst_answer(prompt: str) -> dict:
+        sales = GST_SALES.search(prompt)
+        if not sales:
+            return {}
+        month = GST_PERIOD.search(prompt)
+        year = GST_YEAR.search(prompt)
+        period = month.group(1) if month else "Unknown"
+        if month and year:
+            # Financial year 2024-25: Apr-Dec fall in 2024, Jan-Mar in 2025
+            early = period in ("January", "February", "March")
+            period = f"{period} {'20' + year.group(2) if early else year.group(1)}"
+        return {"month": period, "sales": float(sales.group(1).replace(",", ""))}
@@ -0,0 +1,79 @@
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from pypdf import PdfReader, PdfWriter
+
+from src.config import BUREAU_REPORTS_DIR, EXCEL_PARAM_FILE
+from src.extractors import BureauExtractor
+from src.llm import LLMEngine
+
+from bench.fake_llm import FakeLLM
+from bench.stats import PAGE_CACHE_MODES, isolated_page_cache, peak_rss_mb
+
+
+def build_report(sample: Path, pages: int, out_path: Path) -> Path:
+    """Writes a synthetic bureau report by cycling through the sample's pages."""
+    reader = PdfReader(str(sample))
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    with open(out_path, "wb") as f:
+        writer.write(f)
+    return out_path
+
+
+def measure(extractor: BureauExtractor, pdf_path: Path, page_cache: str) -> dict:
+    # every measurement gets its own cache so one mode never reads text cached by another
+    with isolated_page_cache(page_cache):
+        if page_cache == "warm":
+            extractor.extract(str(pdf_path))
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        extractor.extract(str(pdf_path))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "traced_peak_mb": round(peak / (1024 * 1024), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of in-memory vs streaming bureau extraction")
+    parser.add_argument("--sample", type=Path, default=None, help="Bureau report used to synthesize larger ones")
+    parser.add_argument("--pages", type=int, nargs="+", default=[25, 50, 100, 200, 400])
+    parser.add_argument("--modes", nargs="+", choices=["memory", "streaming"], default=["memory", "streaming"])
+    parser.add_argument("--page-cache", choices=PAGE_CACHE_MODES, default="cold",
+                        help="Page text cache state for each measurement")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sample = args.sample or sorted(BUREAU_REPORTS_DIR.glob("*.pdf"))[0]
+    llm = LLMEngine(model=FakeLLM())
+    extractors = {
+        "memory": BureauExtractor(str(EXCEL_PARAM_FILE), llm, streaming=False),
+        "streaming": BureauExtractor(str(EXCEL_PARAM_FILE), llm, streaming=True),
+    }
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = build_report(sample, pages, Path(tmp) / f"report_{pages}.pdf")
+            row = {"pages": pages, "file_mb": round(pdf_path.stat().st_size / (1024 * 1024), 2)}
+            for mode in args.modes:
+                row[mode] = measure(extractors[mode], pdf_path, args.page_cache)
+            rows.append(row)
+
+    report = {"sample": sample.name, "page_cache": args.page_cache, "results": rows, "peak_rss_mb": peak_rss_mb()}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
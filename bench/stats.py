@@ -0,0 +1,79 @@
+import math
+import resource
+import sys
+import tempfile
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from src.metrics import REGISTRY
+from src.page_cache import PAGE_CACHE
+
+# off: pypdf on every document; cold: a fresh empty cache per run, so pages are
+# parsed and written; warm: the cache is primed before the measured run
+PAGE_CACHE_MODES = ("off", "cold", "warm")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 6) if ordered else 0.0,
+        "p50": round(percentile(ordered, 50), 6),
+        "p90": round(percentile(ordered, 90), 6),
+        "p99": round(percentile(ordered, 99), 6),
+        "max": round(ordered[-1], 6) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
+
+
+class StageRecorder:
+    """Collects raw span durations from the metrics registry while active."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.paused = False
+
+    def __call__(self, stage: str, seconds: float, sizes: Dict[str, float]):
+        if not self.paused:
+            self.durations[stage].append(seconds)
+
+    def __enter__(self):
+        REGISTRY.add_listener(self)
+        return self
+
+    def __exit__(self, *exc):
+        REGISTRY.remove_listener(self)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in sorted(self.durations.items())}
+
+
+@contextmanager
+def isolated_page_cache(mode: str):
+    """Points the shared page text cache at a fresh temporary directory, or turns it off.
+
+    Keeps benchmark runs independent of each other and of the user's .cache/.
+    """
+    saved = (PAGE_CACHE.cache_dir, PAGE_CACHE.enabled)
+    with tempfile.TemporaryDirectory(prefix="bench-pages-") as tmp:
+        PAGE_CACHE.cache_dir, PAGE_CACHE.enabled = Path(tmp), mode != "off"
+        try:
+            yield
+        finally:
+            PAGE_CACHE.cache_dir, PAGE_CACHE.enabled = saved
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from starlette.concurrency import run_in_threadpool
+
+from src.config import (
+    ADMISSION_BUREAU_CONCURRENCY, ADMISSION_BUREAU_MAX_QUEUE, ADMISSION_BUREAU_MAX_WAIT,
+    ADMISSION_GST_CONCURRENCY, ADMISSION_GST_MAX_QUEUE, ADMISSION_GST_MAX_WAIT,
+    ADMISSION_AUTO_CONCURRENCY, ADMISSION_AUTO_MAX_QUEUE, ADMISSION_AUTO_MAX_WAIT,
+)
+from src.metrics import ADMISSION_DECISIONS, ADMISSION_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    def __init__(self, kind: str, retry_after: float):
+        super().__init__(f"{kind} extraction queue is full")
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class Budget:
+    """Concurrency slots and queue bound for one class of request.
+
+    Admitted requests beyond `concurrency` wait for a slot on the event loop,
+    not in a worker thread, so a long queue never holds threadpool tokens
+    that other endpoints need. A request is
+    rejected when the queue is full or the estimated wait (queue position x
+    EWMA latency / slots) exceeds `max_wait` seconds.
+    """
+
+    def __init__(self, kind: str, concurrency: int, max_queue: int, max_wait: float,
+                 initial_latency: float, alpha: float = 0.2):
+        self.kind = kind
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self.latency = initial_latency
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._lock = threading.Lock()
+
+    def estimated_wait(self, in_flight: int) -> float:
+        queued = max(0, in_flight - self.concurrency + 1)
+        return queued * self.latency / self.concurrency
+
+    def admit(self) -> "Ticket":
+        with self._lock:
+            queued = self.in_flight - self.concurrency + 1
+            wait = self.estimated_wait(self.in_flight)
+            if queued > self.max_queue or wait > self.max_wait:
+                ADMISSION_DECISIONS.inc(kind=self.kind, decision="rejected")
+                # by then roughly one request's worth of queue should have drained
+                raise Overloaded(self.kind, max(1.0, wait - self.max_wait, self.latency / self.concurrency))
+            self.in_flight += 1
+        ADMISSION_DECISIONS.inc(kind=self.kind, decision="admitted")
+        return Ticket(self)
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self.latency += self.alpha * (seconds - self.latency)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class Ticket:
+    """Holds a place in a Budget; use as a context manager around the whole request."""
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self._released = False
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Waits for a slot without blocking a thread, then runs the blocking func in the threadpool."""
+        queued_at = time.perf_counter()
+        async with self.budget._slots:
+            started = time.perf_counter()
+            ADMISSION_WAIT_SECONDS.observe(started - queued_at, kind=self.budget.kind)
+            try:
+                return await run_in_threadpool(func, *args, **kwargs)
+            finally:
+                self.budget._observe(time.perf_counter() - started)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget._leave()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Separate budgets per document type so cheap GST returns never queue behind bureau reports.
+
+    "auto" covers receiving and classifying uploads of unknown type; the
+    extraction itself is then admitted under the detected type.
+    """
+
+    def __init__(self, budgets: Dict[str, Budget] = None):
+        self.budgets = budgets or {
+            "bureau": Budget("bureau", ADMISSION_BUREAU_CONCURRENCY, ADMISSION_BUREAU_MAX_QUEUE,
+                             ADMISSION_BUREAU_MAX_WAIT, initial_latency=30.0),
+            "gst": Budget("gst", ADMISSION_GST_CONCURRENCY, ADMISSION_GST_MAX_QUEUE,
+                          ADMISSION_GST_MAX_WAIT, initial_latency=5.0),
+            "auto": Budget("auto", ADMISSION_AUTO_CONCURRENCY, ADMISSION_AUTO_MAX_QUEUE,
+                           ADMISSION_AUTO_MAX_WAIT, initial_latency=0.5),
+        }
+
+    def admit(self, kind: str) -> Ticket:
+        """Raises Overloaded with a retry-after estimate when the budget is exhausted."""
+        return self.budgets[kind].admit()
@@ -0,0 +1,158 @@
+import json
+import logging
+import socket
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+SHARD_FORMAT_VERSION = 1
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'2/8' -> (2, 8); shards are numbered from 0."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_of(digest: str, count: int) -> int:
+    return int(digest, 16) % count
+
+
+def select_shard(files: Iterable[Tuple[Path, str]], index: int, count: int) -> List[Tuple[Path, str, str]]:
+    """Keeps the (path, doc type) pairs whose content hash falls in this shard.
+
+    Partitioning by content rather than by name means every machine agrees
+    without coordination, even if their directory listings are ordered or
+    named differently. Returns (path, doc type, sha256).
+    """
+    selected = []
+    for path, dtype in files:
+        digest = file_sha256(str(path))
+        if shard_of(digest, count) == index:
+            selected.append((path, dtype, digest))
+    return selected
+
+
+def result_key(path: Path, owners: Dict[str, Path], digest: Optional[str] = None) -> str:
+    """Key for a file's result: its name, or '<name>#<sha256 prefix>' when a
+    different file with the same name was already processed (as merge does).
+
+    `owners` maps keys handed out so far to their paths and is updated.
+    """
+    key = path.name
+    if owners.get(key, path) != path:
+        key = f"{path.name}#{(digest or file_sha256(str(path)))[:12]}"
+        logger.warning("%s has the same name as %s; storing its result as %s", path, owners[path.name], key)
+    owners[key] = path
+    return key
+
+
+class ShardWriter:
+    """Accumulates one shard's results and rewrites its output file after each document."""
+
+    def __init__(self, output_path: Path, index: int, count: int):
+        self.output_path = Path(output_path)
+        self.meta = {
+            "version": SHARD_FORMAT_VERSION,
+            "index": index,
+            "count": count,
+            "host": socket.gethostname(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "documents": 0,
+            "errors": 0,
+            "busy_seconds": 0.0,
+        }
+        self.results: Dict[str, dict] = {}
+        self.files: Dict[str, dict] = {}
+        self._started = time.perf_counter()
+
+    def add(self, name: str, digest: str, result: dict, seconds: float):
+        self.results[name] = result
+        self.files[name] = {"sha256": digest, "seconds": round(seconds, 4)}
+        self.meta["documents"] += 1
+        self.meta["errors"] += int("error" in result)
+        self.meta["busy_seconds"] = round(self.meta["busy_seconds"] + seconds, 4)
+
+    def write(self, default=None):
+        self.meta["elapsed_seconds"] = round(time.perf_counter() - self._started, 4)
+        payload = {"shard": self.meta, "files": self.files, "results": self.results}
+        tmp = self.output_path.with_suffix(self.output_path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=2, default=default))
+        tmp.replace(self.output_path)
+
+
+def merge_shards(paths: Iterable[Path]) -> Tuple[Dict[str, dict], dict]:
+    """Combines shard files into the standard {filename: result} layout.
+
+    The same document (by hash) seen more than once is kept once, preferring
+    a successful result; different documents sharing a file name are kept
+    side by side as '<name>#<sha256 prefix>'. Returns (results, report).
+    """
+    merged: Dict[str, dict] = {}
+    owners: Dict[str, Tuple[str, str]] = {}  # sha256 -> (merged key, shard label)
+    names: Dict[str, str] = {}  # merged key -> sha256
+    shards, duplicates, collisions = [], [], []
+    expected_count = None
+
+    for path in paths:
+        data = json.loads(Path(path).read_text())
+        meta = data.get("shard", {})
+        label = f"{meta.get('index', '?')}/{meta.get('count', '?')}@{meta.get('host', '?')}"
+        if expected_count is None:
+            expected_count = meta.get("count")
+        elif meta.get("count") != expected_count:
+            logger.warning("%s was produced with %s shards, expected %s", path, meta.get("count"), expected_count)
+
+        elapsed = meta.get("elapsed_seconds") or 0.0
+        shards.append({
+            "file": str(path),
+            "shard": label,
+            "documents": meta.get("documents", 0),
+            "errors": meta.get("errors", 0),
+            "elapsed_seconds": elapsed,
+            "docs_per_sec": round(meta.get("documents", 0) / elapsed, 4) if elapsed else 0.0,
+        })
+
+        for name, result in data.get("results", {}).items():
+            digest = data.get("files", {}).get(name, {}).get("sha256", "")
+            if digest and digest in owners:
+                key, first = owners[digest]
+                duplicates.append({"file": name, "sha256": digest, "shards": [first, label]})
+                if "error" in merged[key] and "error" not in result:
+                    merged[key] = result
+                continue
+            key = name
+            if key in names and names[key] != digest:
+                key = f"{name}#{digest[:12]}"
+                collisions.append({"file": name, "sha256": digest, "stored_as": key})
+            merged[key] = result
+            names[key] = digest
+            if digest:
+                owners[digest] = (key, label)
+
+    indexes = {s["shard"].split("@")[0] for s in shards}
+    missing = []
+    if expected_count:
+        missing = [f"{i}/{expected_count}" for i in range(expected_count) if f"{i}/{expected_count}" not in indexes]
+    busiest = max((s["elapsed_seconds"] for s in shards), default=0.0)
+    report = {
+        "shards": shards,
+        "missing_shards": missing,
+        "documents": len(merged),
+        "errors": sum(1 for r in merged.values() if "error" in r),
+        "duplicates": duplicates,
+        "name_collisions": collisions,
+        # shards run in parallel, so the slowest one bounds the whole run
+        "wall_seconds": busiest,
+        "docs_per_sec": round(len(merged) / busiest, 4) if busiest else 0.0,
+    }
+    return merged, report
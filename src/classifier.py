@@ -0,0 +1,136 @@
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from pypdf import PdfReader
+
+from src.config import CLASSIFIER_MIN_CONFIDENCE
+from src.metrics import span
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+# Term weights play the role of IDF: terms that only ever appear in one
+# document family get high weight, generic financial terms get low weight.
+KEYWORDS: Dict[str, Dict[str, float]] = {
+    "gst": {
+        "gstr-3b": 4.0,
+        "gstin": 3.0,
+        "outward taxable supplies": 3.0,
+        "eligible itc": 2.5,
+        "reverse charge": 2.0,
+        "integrated tax": 1.5,
+        "central tax": 1.5,
+        "state/ut tax": 1.5,
+        "cess": 1.0,
+        "arn": 1.0,
+        "legal name of the registered person": 2.0,
+        "inter-state supplies": 1.5,
+        "taxable value": 1.0,
+    },
+    "bureau": {
+        "crif": 4.0,
+        "cibil": 4.0,
+        "credit information": 3.0,
+        "perform consumer": 3.0,
+        "account summary": 2.0,
+        "score": 1.0,
+        "scoring factors": 2.0,
+        "inquiry input information": 2.5,
+        "overdue accounts": 2.0,
+        "sanctioned amount": 1.5,
+        "disbursed amount": 1.5,
+        "payment history": 1.5,
+        "date of issue": 1.0,
+        "dob": 0.5,
+    },
+}
+
+FILENAME_HINTS = {
+    "gst": ("gst", "3b"),
+    "bureau": ("bureau", "crif", "report"),
+}
+
+
+@dataclass
+class Classification:
+    doc_type: str
+    confidence: float
+    method: str
+    seconds: float
+    scores: Dict[str, float]
+
+
+def score_text(text: str) -> Dict[str, float]:
+    lowered = text.lower()
+    counts = Counter(TOKEN.findall(lowered))
+    scores = {}
+    for doc_type, weights in KEYWORDS.items():
+        total = 0.0
+        for term, weight in weights.items():
+            # single tokens are counted on word boundaries, phrases on the raw
+            # text; sublinear tf keeps a term repeated on every table row from
+            # dominating
+            tf = counts.get(term, 0) if TOKEN.fullmatch(term) else lowered.count(term)
+            if tf:
+                total += weight * (1.0 + math.log(tf))
+        scores[doc_type] = total
+    return scores
+
+
+class DocumentClassifier:
+    """Routes a PDF to an extractor using only its first page.
+
+    Runs before any embedding or LLM work. Confidence combines how far the
+    winning family is ahead of the runner-up with how much evidence there is
+    at all; below min_confidence the document is 'unknown' unless the
+    filename gives a hint.
+    """
+
+    def __init__(self, min_confidence: float = CLASSIFIER_MIN_CONFIDENCE, evidence_scale: float = 8.0):
+        self.min_confidence = min_confidence
+        self.evidence_scale = evidence_scale
+
+    def classify_text(self, text: str) -> Classification:
+        start = time.perf_counter()
+        scores = score_text(text)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_type, best), (_, runner_up) = ranked[0], ranked[1]
+        if best <= 0:
+            confidence = 0.0
+        else:
+            margin = (best - runner_up) / best
+            evidence = 1.0 - math.exp(-best / self.evidence_scale)
+            confidence = round(margin * evidence, 3)
+        doc_type = best_type if confidence >= self.min_confidence else "unknown"
+        return Classification(doc_type, confidence, "content", time.perf_counter() - start, scores)
+
+    def classify(self, file_path: str, filename: Optional[str] = None) -> Classification:
+        start = time.perf_counter()
+        with span("classify") as s:
+            text = ""
+            try:
+                reader = PdfReader(file_path)
+                if reader.pages:
+                    text = reader.pages[0].extract_text() or ""
+            except Exception:
+                pass
+            s.set(chars=len(text))
+            result = self.classify_text(text)
+            if result.doc_type == "unknown":
+                hinted = self._filename_hint(filename or Path(file_path).name)
+                if hinted:
+                    result.doc_type, result.method = hinted, "filename"
+        result.seconds = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _filename_hint(filename: str) -> Optional[str]:
+        lowered = filename.lower()
+        for doc_type, hints in FILENAME_HINTS.items():
+            if any(h in lowered for h in hints):
+                return doc_type
+        return None
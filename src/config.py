@@ -10,5 +10,94 @@ EXCEL_PARAM_FILE = DATA_DIR / "Bureau parameters - Report.xlsx"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 LLM_MODEL_NAME = "mistral"
 LLM_PROVIDER = "ollama"
+# "bulk" (one call for all parameters) or "grouped" (concurrent call per parameter group;
+# set OLLAMA_NUM_PARALLEL on the server to at least LLM_GROUP_CONCURRENCY)
+LLM_EXECUTION_MODE = os.getenv("LLM_EXECUTION_MODE", "bulk").lower()
+LLM_GROUP_CONCURRENCY = int(os.getenv("LLM_GROUP_CONCURRENCY", "4"))
+# Comma-separated, cheapest first (e.g. "qwen2.5:3b-instruct-q4_K_M,mistral"); parameters whose
+# answer is null, invalid or below LLM_ESCALATION_CONFIDENCE go to the next model
+LLM_CASCADE_MODELS = [m.strip() for m in os.getenv("LLM_CASCADE_MODELS", LLM_MODEL_NAME).split(",") if m.strip()]
+LLM_ESCALATION_CONFIDENCE = float(os.getenv("LLM_ESCALATION_CONFIDENCE", "0.8"))
+# Every Nth cascade request (and the first) runs the full plan on the last model only, to
+# calibrate the "no cascade" baseline latency; 0 calibrates once
+LLM_CASCADE_CALIBRATION_INTERVAL = int(os.getenv("LLM_CASCADE_CALIBRATION_INTERVAL", "50"))
+# "record" saves every LLM response to LLM_REPLAY_FILE, "replay" answers from it without a model server
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "off").lower()
+LLM_REPLAY_FILE = Path(os.getenv("LLM_REPLAY_FILE", BASE_DIR / "tests" / "recordings" / "llm_responses.jsonl"))
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# How long Ollama keeps a model loaded after a request; cascade models are pinned (-1) unless LLM_PIN_CASCADE=0
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_PIN_CASCADE = os.getenv("LLM_PIN_CASCADE", "1").lower() not in ("0", "false", "no")
+# API only: re-warm models this often while the service is up; 0 disables
+LLM_HEARTBEAT_SECONDS = float(os.getenv("LLM_HEARTBEAT_SECONDS", "240"))
+# How long a residency check (/api/ps) is reused for labelling call latency as cold/warm
+LLM_RESIDENCY_TTL_SECONDS = float(os.getenv("LLM_RESIDENCY_TTL_SECONDS", "30"))
+# num_ctx is sized from the prompt length within these bounds and only grows per model
+LLM_NUM_CTX_MIN = int(os.getenv("LLM_NUM_CTX_MIN", "2048"))
+LLM_NUM_CTX_MAX = int(os.getenv("LLM_NUM_CTX_MAX", "16384"))
+LLM_NUM_PREDICT_RESERVE = int(os.getenv("LLM_NUM_PREDICT_RESERVE", "512"))
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3.0"))
 
 CHROMA_PERSIST_DIR = BASE_DIR / "chroma_db"
+
+CACHE_DIR = Path(os.getenv("CACHE_DIR", BASE_DIR / ".cache"))
+PLAN_CACHE_DIR = CACHE_DIR / "plans"
+PAGE_CACHE_DIR = CACHE_DIR / "pages"
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+# least recently used page cache files are deleted once the directory grows past this; 0 disables eviction
+PAGE_CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "1024"))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR / "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.0"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+# --watch: poll interval, how long a file must stay unchanged before it is processed, and
+# where processed files are remembered across restarts
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "5"))
+WATCH_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", "10"))
+WATCH_STATE_FILE = Path(os.getenv("WATCH_STATE_FILE", CACHE_DIR / "watch_state.json"))
+# Failed files are retried after WATCH_RETRY_SECONDS, doubling per failure up to WATCH_RETRY_MAX_SECONDS
+WATCH_RETRY_SECONDS = float(os.getenv("WATCH_RETRY_SECONDS", "60"))
+WATCH_RETRY_MAX_SECONDS = float(os.getenv("WATCH_RETRY_MAX_SECONDS", "3600"))
+
+STREAMING_PAGE_THRESHOLD = int(os.getenv("STREAMING_PAGE_THRESHOLD", "100"))
+STREAMING_WINDOW_PAGES = int(os.getenv("STREAMING_WINDOW_PAGES", "16"))
+
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+
+# API admission control: concurrent extractions, queued requests and the longest
+# estimated queue wait (seconds) before answering 429, per document type. Each bureau
+# extraction indexes into its own collection; the model is usually the bottleneck.
+ADMISSION_BUREAU_CONCURRENCY = int(os.getenv("ADMISSION_BUREAU_CONCURRENCY", "1"))
+ADMISSION_BUREAU_MAX_QUEUE = int(os.getenv("ADMISSION_BUREAU_MAX_QUEUE", "8"))
+ADMISSION_BUREAU_MAX_WAIT = float(os.getenv("ADMISSION_BUREAU_MAX_WAIT", "120"))
+ADMISSION_GST_CONCURRENCY = int(os.getenv("ADMISSION_GST_CONCURRENCY", "4"))
+ADMISSION_GST_MAX_QUEUE = int(os.getenv("ADMISSION_GST_MAX_QUEUE", "16"))
+ADMISSION_GST_MAX_WAIT = float(os.getenv("ADMISSION_GST_MAX_WAIT", "30"))
+# /api/extract/auto: saving and classifying the upload, before its typed admission
+ADMISSION_AUTO_CONCURRENCY = int(os.getenv("ADMISSION_AUTO_CONCURRENCY", "4"))
+ADMISSION_AUTO_MAX_QUEUE = int(os.getenv("ADMISSION_AUTO_MAX_QUEUE", "32"))
+ADMISSION_AUTO_MAX_WAIT = float(os.getenv("ADMISSION_AUTO_MAX_WAIT", "10"))
+
+# Window for the "N+ DPD (Configurable Period)" parameters; 0 means the whole history
+DPD_WINDOW_MONTHS = int(os.getenv("DPD_WINDOW_MONTHS", "12"))
+# Comma-separated account-type substrings (e.g. "PERSONAL LOAN,BUSINESS LOAN"); empty means all
+DPD_LOAN_TYPES = [t.strip() for t in os.getenv("DPD_LOAN_TYPES", "").split(",") if t.strip()]
+
+# Namespaces in the persistent store unused for this many days are deleted; 0 disables GC
+CHROMA_NAMESPACE_TTL_DAYS = float(os.getenv("CHROMA_NAMESPACE_TTL_DAYS", "30"))
+# Bureau retrieval in an applicant namespace: "document" searches only the report being
+# extracted, "applicant" (opt-in) every bureau report stored for the applicant
+CHROMA_SEARCH_SCOPE = os.getenv("CHROMA_SEARCH_SCOPE", "document").lower()
+# Seconds between persisted last-access updates of a namespace (its TTL is measured in days)
+CHROMA_TOUCH_INTERVAL = float(os.getenv("CHROMA_TOUCH_INTERVAL", "300"))
+# Seconds between TTL sweeps of stale namespaces in a long-running process (0 sweeps at start-up only)
+CHROMA_GC_INTERVAL_SECONDS = float(os.getenv("CHROMA_GC_INTERVAL_SECONDS", "3600"))
+
+# Columnar export (--export): where tables go and how many rows are buffered per row group
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", BASE_DIR / "exports"))
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "65536"))
@@ -0,0 +1,150 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+ASSET_CLASSES = {"XXX": -1, "STD": 0, "SMA": 1, "SUB": 2, "DBT": 3, "LSS": 4}
+# Asset classes that imply at least this many days past due even when the
+# DPD column is masked ("XXX/SUB")
+ASSET_CLASS_MIN_DPD = {"SUB": 90, "DBT": 90, "LSS": 90}
+UNKNOWN_DPD = -1
+
+RECORD_DTYPE = np.dtype([
+    ("account", np.int32),
+    ("month", np.int32),
+    ("dpd", np.int16),
+    ("asset_class", np.int8),
+])
+
+ACCOUNT_HEADER = re.compile(r"^\s*(\d+)\s+Account Type:\s*(.*?)\s*Credit Grantor:", re.MULTILINE)
+GRID_START = "Payment History/Asset Classification"
+CELL = r"(?:-|[0-9X]{3}/[A-Z]{3})"
+GRID_ROW = re.compile(rf"^(\d{{4}})((?:\s+{CELL}){{12}})\s*$")
+ISSUE_DATE = re.compile(r"Date of Issue:\s*(\d{2}-\d{2}-\d{4})")
+DPD_PARAMETER = re.compile(r"^(\d+)\+\s*DPD", re.IGNORECASE)
+
+
+def month_ordinal(year: int, month: int) -> int:
+    return year * 12 + (month - 1)
+
+
+class PaymentHistory:
+    """Payment-history grid of every account in a bureau report.
+
+    `records` holds one row per reported (account, month) cell. Aggregates
+    are boolean masks over these columns, so any window, threshold or loan
+    type filter costs a few vector operations.
+    """
+
+    def __init__(self, records: np.ndarray, account_types: List[str], reference_month: Optional[int]):
+        self.records = records
+        self.account_types = np.array(account_types, dtype=object)
+        if reference_month is None and len(records):
+            reference_month = int(records["month"].max())
+        self.reference_month = reference_month
+        dpd = records["dpd"].astype(np.int32)
+        for name, floor in ASSET_CLASS_MIN_DPD.items():
+            dpd = np.where(records["asset_class"] == ASSET_CLASSES[name], np.maximum(dpd, floor), dpd)
+        self.effective_dpd = dpd
+
+    @property
+    def num_accounts(self) -> int:
+        return len(self.account_types)
+
+    def _mask(self, threshold: int, months: Optional[int], loan_types: Optional[Iterable[str]]) -> np.ndarray:
+        mask = self.effective_dpd >= threshold
+        if months is not None and self.reference_month is not None:
+            mask &= self.records["month"] > self.reference_month - months
+        if loan_types:
+            wanted = [t.upper() for t in loan_types]
+            selected = np.array([any(w in t for w in wanted) for t in self.account_types], dtype=bool)
+            mask &= selected[self.records["account"]]
+        return mask
+
+    def count_accounts(self, threshold: int, months: Optional[int] = None,
+                       loan_types: Optional[Iterable[str]] = None) -> int:
+        """Accounts with at least one month at or above `threshold` DPD in the window."""
+        mask = self._mask(threshold, months, loan_types)
+        hit = np.zeros(self.num_accounts, dtype=bool)
+        hit[self.records["account"][mask]] = True
+        return int(hit.sum())
+
+    def count_months(self, threshold: int, months: Optional[int] = None,
+                     loan_types: Optional[Iterable[str]] = None) -> int:
+        """Account-months at or above `threshold` DPD in the window."""
+        return int(self._mask(threshold, months, loan_types).sum())
+
+    def max_dpd(self, months: Optional[int] = None, loan_types: Optional[Iterable[str]] = None) -> int:
+        mask = self._mask(0, months, loan_types)
+        return int(self.effective_dpd[mask].max()) if mask.any() else 0
+
+
+class PaymentHistoryParser:
+    """Incrementally parses CRIF account blocks, one page of text at a time."""
+
+    def __init__(self):
+        self._accounts: List[str] = []
+        self._rows: List[tuple] = []
+        self._in_grid = False
+        self._reference_month: Optional[int] = None
+
+    def feed(self, text: str):
+        if self._reference_month is None:
+            issued = ISSUE_DATE.search(text)
+            if issued:
+                date = datetime.strptime(issued.group(1), "%d-%m-%Y")
+                self._reference_month = month_ordinal(date.year, date.month)
+
+        for line in text.splitlines():
+            header = ACCOUNT_HEADER.match(line)
+            if header:
+                self._accounts.append(header.group(2).upper())
+                self._in_grid = False
+                continue
+            if line.startswith(GRID_START):
+                self._in_grid = bool(self._accounts)
+                continue
+            if not self._in_grid:
+                continue
+            row = GRID_ROW.match(line)
+            if row:
+                self._add_row(int(row.group(1)), row.group(2).split())
+
+    def _add_row(self, year: int, cells: List[str]):
+        account = len(self._accounts) - 1
+        for month, cell in enumerate(cells, start=1):
+            if cell == "-":
+                continue
+            dpd, asset = cell.split("/")
+            self._rows.append((
+                account,
+                month_ordinal(year, month),
+                int(dpd) if dpd.isdigit() else UNKNOWN_DPD,
+                ASSET_CLASSES.get(asset, ASSET_CLASSES["XXX"]),
+            ))
+
+    def build(self) -> PaymentHistory:
+        records = np.array(self._rows, dtype=RECORD_DTYPE)
+        return PaymentHistory(records, list(self._accounts), self._reference_month)
+
+
+def parse_payment_history(pages: Iterable[str]) -> PaymentHistory:
+    parser = PaymentHistoryParser()
+    for text in pages:
+        parser.feed(text)
+    return parser.build()
+
+
+def dpd_threshold(parameter_name: str) -> Optional[int]:
+    """Returns 30 for '30+ DPD (Configurable Period)', None for non-DPD parameters."""
+    match = DPD_PARAMETER.match(parameter_name.strip())
+    return int(match.group(1)) if match else None
+
+
+def dpd_results(history: PaymentHistory, thresholds: Dict[str, int], months: Optional[int],
+                loan_types: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    return {
+        name: history.count_accounts(threshold, months=months, loan_types=loan_types)
+        for name, threshold in thresholds.items()
+    }
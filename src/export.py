@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from src.config import EXPORT_ROW_GROUP_ROWS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+BUREAU_SCHEMA = pa.schema([
+    ("file", pa.string()),
+    ("parameter", pa.string()),
+    ("value_number", pa.float64()),
+    ("value_bool", pa.bool_()),
+    ("value_text", pa.string()),
+    ("source", pa.string()),
+    ("confidence", pa.float64()),
+])
+
+GST_SCHEMA = pa.schema([
+    ("file", pa.string()),
+    ("month", pa.string()),
+    ("period", pa.date32()),
+    ("sales", pa.float64()),
+    ("source", pa.string()),
+    ("confidence", pa.float64()),
+])
+
+ERROR_SCHEMA = pa.schema([
+    ("file", pa.string()),
+    ("error", pa.string()),
+])
+
+
+def _field(item: Any, name: str, default: Any = None) -> Any:
+    # results are BureauParameter/GstSale models in-process and plain dicts once read back from JSON
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def period_of(month: str) -> Optional[date]:
+    """'January 2025' / 'Jan 2025' -> date(2025, 1, 1); None if it doesn't parse."""
+    for fmt in ("%B %Y", "%b %Y"):
+        try:
+            return datetime.strptime(month.strip(), fmt).date()
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+def bureau_rows(file_name: str, parameters: Dict[str, Any]) -> List[dict]:
+    """One row per parameter; the value lands in the column matching its type."""
+    rows = []
+    for name, parameter in parameters.items():
+        value = _field(parameter, "value")
+        row = {"file": file_name, "parameter": name, "value_number": None, "value_bool": None, "value_text": None,
+               "source": _field(parameter, "source"), "confidence": _number(_field(parameter, "confidence"))}
+        if isinstance(value, bool):
+            row["value_bool"] = value
+        elif isinstance(value, (int, float)):
+            row["value_number"] = float(value)
+        elif isinstance(value, str):
+            row["value_text"] = value
+        elif value is not None:
+            row["value_text"] = json.dumps(value, default=str)
+        rows.append(row)
+    return rows
+
+
+def gst_rows(file_name: str, sales: Iterable[Any]) -> List[dict]:
+    return [
+        {"file": file_name, "month": _field(sale, "month"), "period": period_of(_field(sale, "month")),
+         "sales": _number(_field(sale, "sales")), "source": _field(sale, "source"),
+         "confidence": _number(_field(sale, "confidence"))}
+        for sale in sales
+    ]
+
+
+class TableWriter:
+    """Streams rows of one schema into a Parquet or Arrow IPC file, one row group per flush.
+
+    The file is written under a temporary name and published on close(), so
+    readers never see a half-written table.
+    """
+
+    def __init__(self, path: Path, schema: pa.Schema, fmt: str = "parquet",
+                 row_group_rows: int = EXPORT_ROW_GROUP_ROWS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        self.path = Path(path)
+        self.schema = schema
+        self.format = fmt
+        self.row_group_rows = max(1, row_group_rows)
+        self.rows = 0
+        self._buffer: List[dict] = []
+        self._tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(str(self._tmp), schema)
+        else:
+            self._sink = pa.OSFile(str(self._tmp), "wb")
+            self._writer = ipc.new_file(self._sink, schema)
+
+    def add(self, rows: List[dict]):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        batch = pa.RecordBatch.from_pylist(self._buffer, schema=self.schema)
+        if self.format == "parquet":
+            self._writer.write_batch(batch, row_group_size=len(self._buffer))
+        else:
+            self._writer.write_batch(batch)
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if self.format == "arrow":
+            self._sink.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self):
+        try:
+            self._writer.close()
+            if self.format == "arrow":
+                self._sink.close()
+        finally:
+            try:
+                os.unlink(self._tmp)
+            except OSError:
+                pass
+
+
+class ColumnarExporter:
+    """Writes extraction results as typed tables: bureau parameters, GST monthly sales, and
+    the documents that failed to extract.
+
+    Feed it results as they are produced with add(); rows are flushed in row
+    groups of row_group_rows so memory stays flat over a whole corpus. Use as
+    a context manager: the tables are published on a clean exit and discarded
+    if the run fails.
+    """
+
+    def __init__(self, directory: Path, fmt: str = "parquet", suffix: str = "",
+                 row_group_rows: int = EXPORT_ROW_GROUP_ROWS):
+        directory = Path(directory)
+        extension = FORMATS.get(fmt, "")
+        self.bureau = TableWriter(directory / f"bureau_parameters{suffix}{extension}", BUREAU_SCHEMA, fmt,
+                                  row_group_rows)
+        self.gst = TableWriter(directory / f"gst_sales{suffix}{extension}", GST_SCHEMA, fmt, row_group_rows)
+        self.errors = TableWriter(directory / f"extraction_errors{suffix}{extension}", ERROR_SCHEMA, fmt,
+                                  row_group_rows)
+        self.skipped = 0
+
+    @property
+    def paths(self) -> List[Path]:
+        return [self.bureau.path, self.gst.path, self.errors.path]
+
+    def add(self, file_name: str, result: Dict[str, Any]):
+        """Takes one document's result in the extraction_results.json layout.
+
+        Failed documents have no rows to export; they go to the errors table instead.
+        """
+        if "error" in result:
+            self.skipped += 1
+            logger.warning("Not exporting %s: %s", file_name, result["error"])
+            self.errors.add([{"file": file_name, "error": str(result["error"])}])
+        if "bureau_parameters" in result:
+            self.bureau.add(bureau_rows(file_name, result["bureau_parameters"]))
+        if "gst_sales" in result:
+            self.gst.add(gst_rows(file_name, result["gst_sales"]))
+
+    def close(self):
+        self.bureau.close()
+        self.gst.close()
+        self.errors.close()
+        logger.info("Exported %d bureau and %d GST rows (%d failed documents) to %s", self.bureau.rows,
+                    self.gst.rows, self.skipped, ", ".join(str(p) for p in self.paths))
+
+    def discard(self):
+        self.bureau.discard()
+        self.gst.discard()
+        self.errors.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def export_results(results: Dict[str, Dict[str, Any]], directory: Path, fmt: str = "parquet",
+                   suffix: str = "") -> ColumnarExporter:
+    """Exports a whole {file name: result} mapping, e.g. merged shard results."""
+    with ColumnarExporter(directory, fmt, suffix) as exporter:
+        for file_name, result in results.items():
+            exporter.add(file_name, result)
+    return exporter
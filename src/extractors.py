@@ -1,10 +1,21 @@
+import itertools
+import json
+import logging
 import re
 from typing import List, Dict, Any, Optional
+from src.config import (
+    STREAMING_PAGE_THRESHOLD, STREAMING_WINDOW_PAGES, DPD_WINDOW_MONTHS, DPD_LOAN_TYPES, CHROMA_SEARCH_SCOPE,
+)
+from src.dpd import PaymentHistory, PaymentHistoryParser, dpd_threshold
+from src.metrics import span, track_document
 from src.schema import BureauParameter, GstSale, ExtractionOutput
 from src.loaders import DataLoader
-from src.rag import RAGEngine
-from src.llm import LLMEngine
-from src.utils import extract_number, clean_text
+from src.rag import RAGEngine, derive_namespace
+from src.llm import LLMEngine, ReplayMiss
+from src.plan import PlanCache
+from src.utils import clean_text, file_sha256
+
+logger = logging.getLogger(__name__)
 
 def extract_credit_score_fallback(text: str) -> Optional[int]:
     pattern1 = r'PERFORM\s+CONSUMER\s+[\d.]+\s*(\d{3})-(\d{3})\s*(\d{3})'
@@ -30,123 +41,219 @@ def extract_credit_score_fallback(text: str) -> Optional[int]:
     return None
 
 class BureauExtractor:
-    def __init__(self, excel_path: str, llm_engine: LLMEngine):
-        self.parameters = DataLoader.load_excel_parameters(excel_path)
-        self.rag = RAGEngine()
+    RETRIEVAL_QUERIES = [
+        "CRIF HM Score PERFORM CONSUMER credit score 300-900 range",
+        "CIBIL Score credit rating score",
+        "Account Summary Total Current Balance Overdue Amount Active Accounts Number",
+        "Payment History DPD Days Past Due STD SMA SUB DBT",
+        "Settlement Write-off Suit Filed Wilful Default",
+        "Enquiry Summary Credit Inquiries",
+        "Sanctioned Amount Disbursed Amount Active Loans",
+    ]
+    PRIORITY_PAGES = 10
+    MAX_CONTEXT_PARTS = 15
+    MAX_CONTEXT_CHARS = 12000
+
+    def __init__(self, excel_path: str, llm_engine: LLMEngine, streaming: Optional[bool] = None,
+                 plan_cache: Optional[PlanCache] = None, rag: Optional[RAGEngine] = None):
+        self.excel_path = excel_path
+        self.plan_cache = plan_cache or PlanCache()
+        self.plan_cache.get(excel_path)
+        self.rag = rag or RAGEngine()
         self.llm = llm_engine
+        # None: stream only reports longer than STREAMING_PAGE_THRESHOLD pages
+        self.streaming = streaming
+
+    def extract(self, pdf_path: str, namespace: Optional[str] = None) -> Dict[str, BureauParameter]:
+        """With a namespace (applicant id, or "auto" to use the report's PAN) the
+        pages go to the persistent applicant store instead of a throwaway index."""
+        with track_document("bureau"):
+            return self._extract(pdf_path, namespace)
+
+    def _use_streaming(self, pdf_path: str) -> bool:
+        if self.streaming is not None:
+            return self.streaming
+        return DataLoader.page_count(pdf_path) > STREAMING_PAGE_THRESHOLD
+
+    def _extract(self, pdf_path: str, namespace: Optional[str] = None) -> Dict[str, BureauParameter]:
+        history_parser = PaymentHistoryParser()
+        # each call indexes into its own collection, so concurrent extractions don't collide
+        rag = None if namespace else self.rag.scoped()
+        try:
+            if namespace:
+                filtered_text = self._build_context_persistent(pdf_path, history_parser, namespace)
+            elif self._use_streaming(pdf_path):
+                filtered_text = self._build_context_streaming(pdf_path, history_parser, rag)
+            else:
+                filtered_text = self._build_context(pdf_path, history_parser, rag)
+        finally:
+            if rag:
+                rag.clear()
+        with span("payment_history") as s:
+            history = history_parser.build()
+            s.set(accounts=history.num_accounts, records=len(history.records))
+
+        logger.debug("Context length for %s: %d chars", pdf_path.split('/')[-1], len(filtered_text))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Context preview (first 500 chars):\n%s", filtered_text[:500])
+            if "SCORE" in filtered_text.upper():
+                logger.debug("Score information found in context!")
+            else:
+                logger.debug("Score may not be in context")
+
+        return self._extract_from_context(filtered_text, history)
 
-    def extract(self, pdf_path: str) -> Dict[str, BureauParameter]:
+    def _build_context(self, pdf_path: str, history_parser: PaymentHistoryParser, rag: RAGEngine) -> str:
         chunks = DataLoader.load_pdf(pdf_path)
 
-        print(f"INFO: Loaded {len(chunks)} chunks from PDF")
+        logger.info("Loaded %d chunks from PDF", len(chunks))
+        for chunk in chunks:
+            history_parser.feed(chunk.text)
 
-        self.rag.index_document(chunks)
+        rag.index_document(chunks)
         priority_chunks = []
 
-        for chunk in chunks[:10]:  
+        for chunk in chunks[:self.PRIORITY_PAGES]:
             if chunk.text and len(chunk.text.strip()) > 50:
                 priority_chunks.append(chunk.text)
 
-        queries = [
-            "CRIF HM Score PERFORM CONSUMER credit score 300-900 range",
-            "CIBIL Score credit rating score",
-            "Account Summary Total Current Balance Overdue Amount Active Accounts Number",
-            "Payment History DPD Days Past Due STD SMA SUB DBT",
-            "Settlement Write-off Suit Filed Wilful Default",
-            "Enquiry Summary Credit Inquiries",
-            "Sanctioned Amount Disbursed Amount Active Loans",
-        ]
-
         rag_chunks = []
-        for query in queries:
-            docs = self.rag.retrieve(query, k=3)
+        for query in self.RETRIEVAL_QUERIES:
+            docs = rag.retrieve(query, k=3)
             for doc in docs:
                 if doc.page_content not in rag_chunks:
                     rag_chunks.append(doc.page_content)
 
-        all_text_parts = priority_chunks + rag_chunks
-        filtered_text = "\n---PAGE BREAK---\n".join(all_text_parts[:15])
-        if len(filtered_text) > 12000:
-            filtered_text = filtered_text[:12000] + "\n...[truncated]"
+        return self._join_context(priority_chunks + rag_chunks)
+
+    def _build_context_streaming(self, pdf_path: str, history_parser: PaymentHistoryParser, rag: RAGEngine) -> str:
+        priority_chunks = []
+
+        def pages():
+            for chunk in DataLoader.iter_pdf_pages(pdf_path, window=STREAMING_WINDOW_PAGES):
+                history_parser.feed(chunk.text)
+                if chunk.page_number <= self.PRIORITY_PAGES and len(chunk.text.strip()) > 50:
+                    priority_chunks.append(chunk.text)
+                yield chunk
+
+        indexed = rag.index_stream(pages(), window=STREAMING_WINDOW_PAGES)
+        logger.info("Streamed %d pages from PDF", indexed)
+
+        rag_pages = []
+        for query in self.RETRIEVAL_QUERIES:
+            for page_number in rag.retrieve_pages(query, k=3):
+                if page_number not in rag_pages:
+                    rag_pages.append(page_number)
+
+        budget = max(0, self.MAX_CONTEXT_PARTS - len(priority_chunks))
+        rag_chunks = [c.text for c in DataLoader.load_pages(pdf_path, rag_pages[:budget])]
+        return self._join_context(priority_chunks + rag_chunks)
 
-        print(f"DEBUG: Context length for {pdf_path.split('/')[-1]}: {len(filtered_text)} chars")
-        print(f"DEBUG: Context preview (first 500 chars):\n{filtered_text[:500]}")
-        if "627" in filtered_text or "SCORE" in filtered_text.upper():
-            print("DEBUG: Score information found in context!")
+    def _build_context_persistent(self, pdf_path: str, history_parser: PaymentHistoryParser,
+                                  namespace: str) -> str:
+        if self._use_streaming(pdf_path):
+            chunks = DataLoader.iter_pdf_pages(pdf_path, window=STREAMING_WINDOW_PAGES)
         else:
-            print("WARNING: Score may not be in context")
-        params_dict = {}
-        for param in self.parameters:
-            key = param.get('parameter name', param.get('parameter', 'Unknown'))
-            desc = param.get('description', key)
-            params_dict[key] = desc
-            
+            chunks = iter(DataLoader.load_pdf(pdf_path))
+        first = next(chunks, None)
+        if first is None:
+            return ""
+        if namespace == "auto":
+            namespace = derive_namespace(first.text) or file_sha256(pdf_path)
+        priority_chunks = []
+
+        def pages():
+            for chunk in itertools.chain([first], chunks):
+                history_parser.feed(chunk.text)
+                if chunk.page_number <= self.PRIORITY_PAGES and len(chunk.text.strip()) > 50:
+                    priority_chunks.append(chunk.text)
+                yield chunk
+
+        doc_hash = file_sha256(pdf_path)
+        store = self.rag.applicant_store
+        added = store.add_document(namespace, pages(), doc_hash, "bureau", window=STREAMING_WINDOW_PAGES)
+        logger.info("Namespace %s: %s", namespace, f"indexed {added} pages" if added else "report already indexed")
+
+        # the parameters describe this report; other reports and GST returns in the
+        # namespace are only searched when explicitly asked for
+        scope = None if CHROMA_SEARCH_SCOPE == "applicant" else doc_hash
+        rag_chunks = []
+        for query in self.RETRIEVAL_QUERIES:
+            for doc in store.search(namespace, query, k=3, doc_hash=scope, doc_type="bureau"):
+                if doc.page_content not in rag_chunks:
+                    rag_chunks.append(doc.page_content)
+        return self._join_context(priority_chunks + rag_chunks)
+
+    def _join_context(self, all_text_parts: List[str]) -> str:
+        filtered_text = "\n---PAGE BREAK---\n".join(all_text_parts[:self.MAX_CONTEXT_PARTS])
+        if len(filtered_text) > self.MAX_CONTEXT_CHARS:
+            filtered_text = filtered_text[:self.MAX_CONTEXT_CHARS] + "\n...[truncated]"
+        return filtered_text
+
+    def _payment_history_parameter(self, name: str, history: PaymentHistory) -> BureauParameter:
+        if not len(history.records):
+            return BureauParameter(value=None, source="Payment History Not Found", confidence=0.0)
+        months = DPD_WINDOW_MONTHS or None
+        value = history.count_accounts(dpd_threshold(name), months=months, loan_types=DPD_LOAN_TYPES)
+        period = f"last {months} months" if months else "full history"
+        return BureauParameter(
+            value=value,
+            source=f"Bureau Report - Payment History ({period})",
+            confidence=0.95
+        )
+
+    def _extract_from_context(self, filtered_text: str, history: PaymentHistory) -> Dict[str, BureauParameter]:
+        plan = self.plan_cache.get(self.excel_path)
         results = {}
+        with span("dpd_aggregate"):
+            for param in plan.parameters:
+                if param.derived == "payment_history":
+                    results[param.name] = self._payment_history_parameter(param.name, history)
         try:
-            raw_data = self.llm.extract_bulk_parameters(filtered_text, params_dict)
-            if raw_data.get("CIBIL Score") is None:
-                fallback_score = extract_credit_score_fallback(filtered_text)
-                if fallback_score:
-                    raw_data["CIBIL Score"] = fallback_score
-                    print(f"DEBUG: Fallback extraction found credit score: {fallback_score}")
-            for key in params_dict.keys():
-                val = raw_data.get(key)
-                final_value = val
-                confidence = 0.0
-                source = "Not Found"
-                if isinstance(val, str):
-                    if val.lower() in ['null', 'not found', 'n/a', 'na']:
-                        final_value = None
-                        confidence = 0.0
-                        source = "Not Found"
-                    else:
-                        num = extract_number(val)
-                        if num is not None and len(val) < 20:
-                            final_value = num
-                            confidence = 0.85  
-                            source = "Bureau Report - RAG Analysis"
-                        else:
-                            final_value = val
-                            confidence = 0.75  
-                            source = "Bureau Report - RAG Analysis"
-                elif isinstance(val, (int, float)):
-                    final_value = val
-                    confidence = 0.90  
-                    source = "Bureau Report - RAG Analysis"
-                elif val is None:
-                    final_value = None
-                    confidence = 0.0
-                    source = "Not Found"
-                else:
-                    final_value = val
-                    confidence = 0.70
-                    source = "Bureau Report - RAG Analysis"
-
-                results[key] = BureauParameter(
-                    value=final_value,
-                    source=source,
-                    confidence=confidence
-                )
+            raw_data = self.llm.extract_parameters(filtered_text, plan)
+            with span("post_process", parameters=len(plan.parameters)):
+                for param in plan.llm_parameters:
+                    value, confidence, source = param.evaluate(raw_data.get(param.name))
+                    if value is None and param.value_type == "score":
+                        fallback_score = extract_credit_score_fallback(filtered_text)
+                        if fallback_score:
+                            logger.debug("Fallback extraction found credit score: %s", fallback_score)
+                            value, confidence, source = param.evaluate(fallback_score)
+
+                    results[param.name] = BureauParameter(
+                        value=value,
+                        source=source,
+                        confidence=confidence
+                    )
 
+        except ReplayMiss:
+            raise
         except Exception as e:
-            print(f"Bulk extraction failed: {e}")
-            for key in params_dict.keys():
-                 results[key] = BureauParameter(
+            logger.error("Bulk extraction failed: %s", e)
+            for param in plan.llm_parameters:
+                 results[param.name] = BureauParameter(
                     value=None,
                     source="Extraction Error",
                     confidence=0.0
                 )
-        self.rag.clear()
-            
-        return results
+
+        return {p.name: results[p.name] for p in plan.parameters if p.name in results}
 
 class GstExtractor:
-    def __init__(self, llm_engine: LLMEngine):
+    def __init__(self, llm_engine: LLMEngine, rag: Optional[RAGEngine] = None):
         self.llm = llm_engine
+        # only needed when returns are kept in an applicant namespace
+        self.rag = rag
+
+    def extract(self, pdf_path: str, namespace: Optional[str] = None) -> List[GstSale]:
+        with track_document("gst"):
+            return self._extract(pdf_path, namespace)
 
-    def extract(self, pdf_path: str) -> List[GstSale]:
+    def _extract(self, pdf_path: str, namespace: Optional[str] = None) -> List[GstSale]:
         chunks = DataLoader.load_pdf(pdf_path)
         sales_data = []
+        if namespace and chunks:
+            self._index(pdf_path, chunks, namespace)
         
         for chunk in chunks:
             if "3.1" in chunk.text and "Outward taxable supplies" in chunk.text:
@@ -165,12 +272,14 @@ class GstExtractor:
                 """
                 try:
                     if self.llm.model:
-                        response = self.llm.model.invoke(prompt)
+                        with span("llm_invoke", prompt_chars=len(prompt)) as s:
+                            response = self.llm.model.invoke(prompt)
+                            s.set(response_chars=len(response))
                         txt = response.strip()
                         txt = txt.replace('```json', '').replace('```', '')
-                        import json
                         try:
-                            data = json.loads(txt)
+                            with span("parse", chars=len(txt)):
+                                data = json.loads(txt)
                             if data and 'sales' in data:
                                 sales_data.append(GstSale(
                                     month=data.get('month', 'Unknown'),
@@ -180,7 +289,18 @@ class GstExtractor:
                                 ))
                         except:
                             pass 
+                except ReplayMiss as miss:
+                    miss.parameters = ("month", "sales")
+                    raise
                 except Exception as e:
-                    print(f"GST Extraction error: {e}")
+                    logger.error("GST Extraction error: %s", e)
                     
         return sales_data
+
+    def _index(self, pdf_path: str, chunks, namespace: str):
+        if namespace == "auto":
+            namespace = derive_namespace(chunks[0].text) or file_sha256(pdf_path)
+        if self.rag is None:
+            self.rag = RAGEngine()
+        added = self.rag.applicant_store.add_document(namespace, chunks, file_sha256(pdf_path), "gst")
+        logger.info("Namespace %s: %s", namespace, f"indexed {added} pages" if added else "return already indexed")
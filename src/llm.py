@@ -1,13 +1,141 @@
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Union
+import hashlib
 import json
+import logging
 import re
-from langchain_community.llms import Ollama
-from src.config import LLM_MODEL_NAME
+import threading
+import time
+from src.config import (
+    LLM_MODEL_NAME, LLM_EXECUTION_MODE, LLM_GROUP_CONCURRENCY,
+    LLM_CASCADE_MODELS, LLM_ESCALATION_CONFIDENCE, LLM_CASCADE_CALIBRATION_INTERVAL, LLM_PIN_CASCADE,
+    LLM_REPLAY_MODE, LLM_REPLAY_FILE,
+)
+from src.metrics import span, CASCADE_PARAMETERS, CASCADE_TIER_SECONDS, CASCADE_SECONDS, CASCADE_BASELINE_SECONDS
+from src.ollama_session import Heartbeat, ModelSession, sessions_of
+from src.plan import ExtractionPlan, plan_from_descriptions
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseStore:
+    """Recorded LLM responses keyed by (model, prompt), kept in a JSONL file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._responses.get(key)
+
+    def put(self, key: str, model_name: str, response: str):
+        with self._lock:
+            if self._responses.get(key) == response:
+                return
+            self._responses[key] = response
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "model": model_name, "response": response}) + "\n")
+
+
+class ReplayMiss(LookupError):
+    """No recorded response for a prompt in replay mode.
+
+    Extractors let it through instead of degrading to null values, so a
+    stale recording fails loudly. Whoever knows which parameters the prompt
+    asked for fills in `parameters`.
+    """
+
+    def __init__(self, model_name: str, key: str, parameters: Tuple[str, ...] = ()):
+        super().__init__(model_name, key)
+        self.model_name = model_name
+        self.key = key
+        self.parameters = parameters
+
+    def __str__(self) -> str:
+        asked = ", ".join(self.parameters) or "prompt"
+        return (f"No recorded {self.model_name} response for {asked} (prompt {self.key[:12]}); "
+                f"the prompt or retrieval changed, re-record with LLM_REPLAY_MODE=record")
+
+
+class ReplayModel:
+    """Wraps a model to record its responses ("record") or answer from them offline ("replay")."""
+
+    def __init__(self, name: str, model: Any, store: ResponseStore, mode: str):
+        self.name = name
+        self.model = model
+        self.store = store
+        self.mode = mode
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        key = self.store.key(self.name, prompt)
+        if self.mode == "replay":
+            response = self.store.get(key)
+            if response is None:
+                raise ReplayMiss(self.name, key)
+            return response
+        response = self.model.invoke(prompt, **kwargs)
+        self.store.put(key, self.name, response)
+        return response
+
 
 class LLMEngine:
-    def __init__(self):
-        self.model = Ollama(model=LLM_MODEL_NAME, temperature=0.1)
-        print(f"Initialized LLM Engine with Ollama model: {LLM_MODEL_NAME}")
+    def __init__(self, model: Optional[Any] = None, execution_mode: str = LLM_EXECUTION_MODE,
+                 concurrency: int = LLM_GROUP_CONCURRENCY,
+                 tiers: Optional[List[Tuple[str, Any]]] = None,
+                 escalation_confidence: float = LLM_ESCALATION_CONFIDENCE,
+                 calibration_interval: int = LLM_CASCADE_CALIBRATION_INTERVAL,
+                 replay_mode: str = LLM_REPLAY_MODE, replay_file: Path = LLM_REPLAY_FILE):
+        """
+        tiers: ordered (name, model) cascade, cheapest first. Defaults to one
+        Ollama session per LLM_CASCADE_MODELS entry, or just `model` if given.
+        replay_mode: "off", "record" (save every response to replay_file) or
+        "replay" (answer only from replay_file, never calling a model).
+        """
+        # "bulk": one call for every parameter; "grouped": one concurrent call per parameter group
+        self.execution_mode = execution_mode
+        self.concurrency = max(1, concurrency)
+        self.escalation_confidence = escalation_confidence
+        self.calibration_interval = calibration_interval
+        if tiers:
+            self.tiers = list(tiers)
+        elif model is not None:
+            self.tiers = [(type(model).__name__, model)]
+        else:
+            names = LLM_CASCADE_MODELS or [LLM_MODEL_NAME]
+            pinned = LLM_PIN_CASCADE and len(names) > 1
+            self.tiers = [(name, ModelSession(name, pinned=pinned)) for name in names]
+        self.heartbeat = Heartbeat(sessions_of(model for _, model in self.tiers))
+        if replay_mode in ("record", "replay"):
+            store = ResponseStore(replay_file)
+            self.tiers = [(name, ReplayModel(name, m, store, replay_mode)) for name, m in self.tiers]
+            logger.info("LLM %s mode using %s", replay_mode, replay_file)
+        # the last tier is authoritative; single-shot callers (GST, extract_value) use it directly
+        self.model = self.tiers[-1][1]
+        # EWMA of a full-plan call on the last tier: what a request costs without the cascade
+        self._baseline_seconds: Optional[float] = None
+        self._cascade_requests = 0
+        self._stats_lock = threading.Lock()
+        logger.info("Initialized LLM Engine with models: %s", ", ".join(name for name, _ in self.tiers))
+
+    def start_heartbeat(self):
+        """Keeps the Ollama models loaded until stop_heartbeat(); for long-running services."""
+        self.heartbeat.start()
+
+    def stop_heartbeat(self):
+        self.heartbeat.stop()
 
     def extract_value(self, context: str, parameter_name: str, parameter_description: str) -> str:
         prompt = f"""
@@ -26,108 +154,208 @@ class LLMEngine:
         """
         
         try:
-            response = self.model.invoke(prompt)
+            with span("llm_invoke", prompt_chars=len(prompt)) as s:
+                response = self.model.invoke(prompt)
+                s.set(response_chars=len(response))
             return response.strip()
+        except ReplayMiss as miss:
+            miss.parameters = (parameter_name,)
+            raise
         except Exception as e:
-            print(f"LLM Error: {e}")
+            logger.error("LLM Error: %s", e)
             return "error"
 
-    def extract_bulk_parameters(self, context: str, parameters: dict) -> dict:
+    def extract_parameters(self, context: str, plan: ExtractionPlan) -> dict:
+        if len(self.tiers) > 1:
+            return self.extract_cascade(context, plan)
+        return self._extract_with(self.model, context, plan)
+
+    def _extract_with(self, model: Any, context: str, plan: ExtractionPlan) -> dict:
+        if self.execution_mode == "grouped" and plan.group_suffixes:
+            return self.extract_grouped_parameters(context, plan, model)
+        return self.extract_bulk_parameters(context, plan, model)
+
+    def extract_cascade(self, context: str, plan: ExtractionPlan) -> dict:
+        """
+        Runs the plan on each tier in turn. A parameter is escalated to the next
+        tier only if its answer is null, fails validation, or scores below
+        escalation_confidence; the most confident answer across tiers wins.
+
+        The first request, and every calibration_interval-th after it, skips
+        the cascade and runs the full plan on the last tier. Those timings
+        give the baseline added to llm_cascade_baseline_seconds_total for
+        every request, however early the cascade stopped.
+        """
+        if self._should_calibrate():
+            return self._calibrate(context, plan)
+
+        best: Dict[str, Tuple[float, Any]] = {}
+        pending = plan
+        spent = 0.0
+        for index, (name, model) in enumerate(self.tiers):
+            final = index == len(self.tiers) - 1
+            start = time.perf_counter()
+            raw = self._extract_with(model, context, pending)
+            elapsed = time.perf_counter() - start
+            spent += elapsed
+            self._observe_tier(name, elapsed)
+
+            escalate = []
+            for param in pending.llm_parameters:
+                _, confidence, _ = param.evaluate(raw.get(param.name))
+                if param.name not in best or confidence > best[param.name][0]:
+                    best[param.name] = (confidence, raw.get(param.name))
+                if confidence >= self.escalation_confidence:
+                    CASCADE_PARAMETERS.inc(tier=name, outcome="accepted")
+                elif final:
+                    CASCADE_PARAMETERS.inc(tier=name, outcome="exhausted")
+                else:
+                    CASCADE_PARAMETERS.inc(tier=name, outcome="escalated")
+                    escalate.append(param.name)
+            if not escalate:
+                break
+            logger.debug("Escalating %d parameters from %s: %s", len(escalate), name, escalate)
+            pending = plan.subset(escalate)
+
+        CASCADE_SECONDS.inc(spent)
+        with self._stats_lock:
+            baseline = self._baseline_seconds
+        # the gap to llm_cascade_seconds_total is the latency saved (or lost)
+        CASCADE_BASELINE_SECONDS.inc(baseline if baseline is not None else spent)
+        return {name: value for name, (_, value) in best.items()}
+
+    def _should_calibrate(self) -> bool:
+        with self._stats_lock:
+            requests = self._cascade_requests
+            self._cascade_requests += 1
+            if self._baseline_seconds is None:
+                return True
+        return self.calibration_interval > 0 and requests % self.calibration_interval == 0
+
+    def _calibrate(self, context: str, plan: ExtractionPlan) -> dict:
+        name, model = self.tiers[-1]
+        start = time.perf_counter()
+        raw = self._extract_with(model, context, plan)
+        elapsed = time.perf_counter() - start
+        self._observe_tier(name, elapsed)
+        CASCADE_PARAMETERS.inc(len(plan.llm_parameters), tier=name, outcome="calibration")
+        with self._stats_lock:
+            if self._baseline_seconds is None:
+                self._baseline_seconds = elapsed
+            else:
+                self._baseline_seconds += 0.2 * (elapsed - self._baseline_seconds)
+        CASCADE_SECONDS.inc(elapsed)
+        CASCADE_BASELINE_SECONDS.inc(elapsed)
+        logger.debug("Calibrated %s full-plan baseline: %.2fs", name, elapsed)
+        return raw
+
+    def _observe_tier(self, name: str, seconds: float):
+        CASCADE_TIER_SECONDS.observe(seconds, tier=name)
+
+    def extract_grouped_parameters(self, context: str, plan: ExtractionPlan, model: Optional[Any] = None) -> dict:
+        """
+        Extracts each parameter group (score, flags, amounts, counts) in its own
+        concurrent call. Groups that fail to produce JSON are retried once, alone.
+        Returns: dict of {name: value}, only keys belonging to the group that answered
+        """
+        with span("prompt_build") as s:
+            prompts = {group: plan.build_group_prompt(context, group) for group in plan.groups}
+            s.set(chars=sum(len(p) for p in prompts.values()))
+
+        model = model if model is not None else self.model
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(prompts))) as pool:
+            answers = dict(zip(prompts, pool.map(lambda item: self._invoke_group(model, plan, item),
+                                                 prompts.items())))
+
+        result = {}
+        for group, answer in answers.items():
+            if answer is None:
+                logger.warning("Retrying parameter group %s", group)
+                answer = self._invoke_group(model, plan, (group, prompts[group]))
+            if answer is None:
+                continue
+            for param in plan.group_parameters(group):
+                if param.name in answer:
+                    result[param.name] = answer[param.name]
+        logger.debug("Grouped extraction returned %d keys from %d groups", len(result), len(prompts))
+        return result
+
+    def _invoke_group(self, model: Any, plan: ExtractionPlan, item) -> Optional[dict]:
+        group, prompt = item
+        try:
+            with span("llm_invoke", prompt_chars=len(prompt)) as s:
+                response = model.invoke(prompt)
+                s.set(response_chars=len(response))
+            text = response.strip()
+            with span("parse", chars=len(text)):
+                answer = self._parse_json_object(text)
+            if answer is None:
+                logger.error("Could not find JSON in response for group %s", group)
+            return answer
+        except ReplayMiss as miss:
+            miss.parameters = tuple(p.name for p in plan.group_parameters(group))
+            raise
+        except Exception as e:
+            logger.error("LLM error for group %s: %s", group, e)
+            return None
+
+    def extract_bulk_parameters(self, context: str, parameters: Union[ExtractionPlan, Dict[str, str]],
+                                model: Optional[Any] = None) -> dict:
         """
         Extracts multiple parameters at once.
-        parameters: dict of {name: description}
+        parameters: a compiled ExtractionPlan, or dict of {name: description}
         Returns: dict of {name: value}
         """
-        import json
-
-        params_list = []
-        for name, desc in parameters.items():
-            params_list.append(f'- "{name}": {desc}')
-
-        params_text = '\n'.join(params_list)
-
-        prompt = f"""You are a credit bureau data extraction expert. Extract the following credit parameters from the bureau report text below.
-
-PARAMETERS TO EXTRACT:
-{params_text}
-
-BUREAU REPORT TEXT:
-{context}
-
-EXTRACTION RULES:
-1. Look for exact values in the text
-2. For "CIBIL Score": This may appear as "CIBIL Score", "CRIF Score", "CRIF HM Score", or "PERFORM CONSUMER" followed by a score number (typically 300-900 range). Look for patterns like "PERFORM CONSUMER 2.2300-900627" where 627 is the score.
-3. For DPD (Days Past Due): Count total occurrences of delinquency in payment history (look for SMA, SUB, DBT, LSS, or any non-STD status codes)
-4. For "Credit Inquiries": Look in "Enquiry Summary" section or count recent credit inquiries
-5. For "Max Active Loans": Look in "Account Summary" for "Active Accounts" or "Number of Accounts"
-6. For "Total Amount Overdue": Look in "Account Summary" for "Total Amount Overdue" or "Overdue Amt"
-7. For loan counts: Count number of active accounts or loans from account summary
-8. For amounts: Extract numeric values, remove commas and currency symbols
-9. For yes/no questions: Return true/false based on presence of indicators
-10. If you cannot find a value, return null
-11. Return ONLY valid JSON, no explanations
-
-EXTRACTION EXAMPLES:
-- If you see "PERFORM CONSUMER 2.2300-900627", extract 627 as the CIBIL Score
-- If you see "Active Accounts: 25", extract 25 as Max Active Loans
-- If you see "000/STD" in payment history, that means 0 DPD (no delinquency)
-- If you see "030/SMA" or "060/SUB", count those as delinquency days
-
-OUTPUT FORMAT (JSON only):
-{{
-  "CIBIL Score": <number or null>,
-  "NTC Accepted": <true/false/null>,
-  "Overdue Threshold": <number or null>,
-  "30+ DPD (Configurable Period)": <number or null>,
-  "60+ DPD (Configurable Period)": <number or null>,
-  "90+ DPD (Configurable Period)": <number or null>,
-  "Settlement / Write-off": <true/false/null>,
-  "No Live PL/BL": <true/false/null>,
-  "Suit Filed": <true/false/null>,
-  "Wilful Default": <true/false/null>,
-  "Written-off Debt Amount": <number or null>,
-  "Max Loans": <number or null>,
-  "Loan Amount Threshold": <number or null>,
-  "Credit Inquiries": <number or null>,
-  "Max Active Loans": <number or null>
-}}
-
-RESPOND WITH JSON ONLY:"""
+        plan = parameters if isinstance(parameters, ExtractionPlan) else plan_from_descriptions(parameters)
+        model = model if model is not None else self.model
+        with span("prompt_build") as s:
+            prompt = plan.build_prompt(context)
+            s.set(chars=len(prompt))
 
         try:
-            response = self.model.invoke(prompt)
+            with span("llm_invoke", prompt_chars=len(prompt)) as s:
+                response = model.invoke(prompt)
+                s.set(response_chars=len(response))
 
             text = response.strip()
-            print(f"DEBUG: Raw LLM response length: {len(text)} chars")
-            print(f"DEBUG: First 200 chars: {text[:200]}")
-
-            if text.startswith("```json"):
-                text = text.replace("```json", "").replace("```", "")
-            elif text.startswith("```"):
-                text = text.replace("```", "")
+            logger.debug("Raw LLM response length: %d chars", len(text))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("First 200 chars: %s", text[:200])
 
-            text = text.strip()
-
-            start = text.find('{')
-            end = text.rfind('}') + 1
-            if start != -1 and end > start:
-                text = text[start:end]
-            else:
-                print(f"ERROR: Could not find JSON in response")
+            with span("parse", chars=len(text)):
+                result = self._parse_json_object(text)
+            if result is None:
+                logger.error("Could not find JSON in response")
                 return {}
-
-            result = json.loads(text)
-            print(f"DEBUG: Successfully parsed JSON with {len(result)} keys")
+            logger.debug("Successfully parsed JSON with %d keys", len(result))
 
             if "CIBIL Score" in result:
-                print(f"DEBUG: Extracted CIBIL Score: {result['CIBIL Score']}")
+                logger.debug("Extracted CIBIL Score: %s", result['CIBIL Score'])
 
             return result
+        except ReplayMiss as miss:
+            miss.parameters = tuple(p.name for p in plan.llm_parameters)
+            raise
         except json.JSONDecodeError as e:
-            print(f"LLM JSON Parse Error: {e}")
-            print(f"Text that failed to parse: {text if 'text' in locals() else 'None'}")
+            logger.error("LLM JSON Parse Error: %s", e)
+            logger.debug("Text that failed to parse: %s", text if 'text' in locals() else 'None')
             return {}
         except Exception as e:
-            print(f"LLM Bulk Error: {e}")
-            print(f"Raw Response: {text if 'text' in locals() else 'None'}")
+            logger.error("LLM Bulk Error: %s", e)
+            logger.debug("Raw Response: %s", text if 'text' in locals() else 'None')
             return {}
+
+    @staticmethod
+    def _parse_json_object(text: str) -> Optional[dict]:
+        if text.startswith("```json"):
+            text = text.replace("```json", "").replace("```", "")
+        elif text.startswith("```"):
+            text = text.replace("```", "")
+
+        text = text.strip()
+
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start == -1 or end <= start:
+            return None
+        return json.loads(text[start:end])
@@ -1,7 +1,12 @@
+import logging
 import pandas as pd
 from pypdf import PdfReader
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional
 from dataclasses import dataclass
+from src.metrics import span
+from src.page_cache import PAGE_CACHE
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class DocumentChunk:
@@ -10,18 +15,119 @@ class DocumentChunk:
     source_file: str
 
 class DataLoader:
+    @staticmethod
+    def _chunks(texts: List[Optional[str]], file_path: str) -> List[DocumentChunk]:
+        source_file = file_path.split('/')[-1]
+        return [
+            DocumentChunk(text=text, page_number=i + 1, source_file=source_file)
+            for i, text in enumerate(texts) if text
+        ]
+
+    @staticmethod
+    def _cache_failed(writer, error: OSError):
+        # the cache is only an optimisation: a full disk or bad permissions must not fail extraction
+        logger.warning("Could not write page cache, continuing without it: %s", error)
+        writer.discard()
+
     @staticmethod
     def load_pdf(file_path: str) -> List[DocumentChunk]:
-        reader = PdfReader(file_path)
-        chunks = []
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if text:
-                chunks.append(DocumentChunk(
-                    text=text,
-                    page_number=i + 1,
-                    source_file=file_path.split('/')[-1]
-                ))
+        cached = PAGE_CACHE.open(file_path)
+        if cached:
+            with span("load_pdf_cached") as s, cached:
+                chunks = DataLoader._chunks([cached.text(i + 1) for i in range(len(cached))], file_path)
+                s.set(pages=len(cached), chars=sum(len(c.text) for c in chunks))
+            return chunks
+
+        with span("load_pdf") as s:
+            reader = PdfReader(file_path)
+            texts = [page.extract_text() for page in reader.pages]
+            chunks = DataLoader._chunks(texts, file_path)
+            s.set(pages=len(reader.pages), chars=sum(len(c.text) for c in chunks))
+        writer = PAGE_CACHE.writer(file_path)
+        if writer:
+            try:
+                for text in texts:
+                    writer.add(text)
+                writer.commit()
+            except OSError as e:
+                DataLoader._cache_failed(writer, e)
+        return chunks
+
+    @staticmethod
+    def page_count(file_path: str) -> int:
+        cached = PAGE_CACHE.open(file_path)
+        if cached:
+            with cached:
+                return len(cached)
+        return len(PdfReader(file_path).pages)
+
+    @staticmethod
+    def iter_pdf_pages(file_path: str, window: int = 16) -> Iterator[DocumentChunk]:
+        """Yields pages one at a time without holding the whole document.
+
+        pypdf caches every object it resolves on the reader, so a fresh reader
+        is opened per window of pages to keep memory flat on long reports.
+        Pages are appended to the page text cache as they are extracted; the
+        cache file is only published if the whole document was read.
+        """
+        source_file = file_path.split('/')[-1]
+        cached = PAGE_CACHE.open(file_path)
+        if cached:
+            with cached:
+                for page_number in range(1, len(cached) + 1):
+                    text = cached.text(page_number)
+                    if text:
+                        yield DocumentChunk(text=text, page_number=page_number, source_file=source_file)
+            return
+
+        total = DataLoader.page_count(file_path)
+        writer = PAGE_CACHE.writer(file_path)
+        try:
+            for start in range(0, total, window):
+                with span("load_pdf_window") as s:
+                    reader = PdfReader(file_path)
+                    texts = [
+                        (i + 1, reader.pages[i].extract_text())
+                        for i in range(start, min(start + window, total))
+                    ]
+                    del reader
+                    s.set(pages=len(texts), chars=sum(len(t or "") for _, t in texts))
+                for page_number, text in texts:
+                    if writer:
+                        try:
+                            writer.add(text)
+                        except OSError as e:
+                            DataLoader._cache_failed(writer, e)
+                            writer = None
+                    if text:
+                        yield DocumentChunk(text=text, page_number=page_number, source_file=source_file)
+        except BaseException:
+            if writer:
+                writer.discard()
+            raise
+        if writer:
+            try:
+                writer.commit()
+            except OSError as e:
+                DataLoader._cache_failed(writer, e)
+
+    @staticmethod
+    def load_pages(file_path: str, page_numbers: Iterable[int]) -> List[DocumentChunk]:
+        """Re-reads specific 1-based pages, in the order given."""
+        source_file = file_path.split('/')[-1]
+        cached = PAGE_CACHE.open(file_path)
+        with span("load_pages_cached" if cached else "load_pages") as s:
+            if cached:
+                with cached:
+                    texts = [(n, cached.text(n)) for n in page_numbers]
+            else:
+                reader = PdfReader(file_path)
+                texts = [(n, reader.pages[n - 1].extract_text()) for n in page_numbers]
+            chunks = [
+                DocumentChunk(text=text, page_number=page_number, source_file=source_file)
+                for page_number, text in texts if text
+            ]
+            s.set(pages=len(chunks), chars=sum(len(c.text) for c in chunks))
         return chunks
 
     @staticmethod
@@ -31,5 +137,5 @@ class DataLoader:
             df.columns = [c.lower().strip() for c in df.columns]
             return df.to_dict(orient='records')
         except Exception as e:
-            print(f"Error loading Excel: {e}")
+            logger.error("Error loading Excel: %s", e)
             return []
@@ -1,17 +1,25 @@
 import argparse
 import json
+import logging
 import os
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
 
 import sys
 from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import EXCEL_PARAM_FILE, BUREAU_REPORTS_DIR, GST_RETURNS_DIR
+from src.config import EXCEL_PARAM_FILE, BUREAU_REPORTS_DIR, GST_RETURNS_DIR, LOG_LEVEL, EXPORT_DIR
 from src.llm import LLMEngine
 from src.extractors import BureauExtractor, GstExtractor
 from src.schema import ExtractionOutput
+from src.profiling import ExtractionProfiler
+from src.classifier import DocumentClassifier
+from src.batch import ShardWriter, merge_shards, parse_shard, result_key, select_shard
+from src.watcher import FolderWatcher
+from src.export import FORMATS, ColumnarExporter, export_results
 
 def serialize(obj):
     if hasattr(obj, 'to_json'):
@@ -20,16 +28,140 @@ def serialize(obj):
         return obj.model_dump(mode='json')
     return obj.__dict__
 
+def extract_file(file_path: Path, dtype: str, bureau_extractor, gst_extractor, profiler, args) -> dict:
+    try:
+        with profiler.profile(str(file_path), label=dtype, forced=args.profile):
+            if dtype == "bureau":
+                data = bureau_extractor.extract(str(file_path), namespace=args.applicant)
+                return {"bureau_parameters": {k: v.model_dump() for k,v in data.items()}}
+            data = gst_extractor.extract(str(file_path), namespace=args.applicant)
+            return {"gst_sales": [d.model_dump() for d in data]}
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return {"error": str(e)}
+
+
+def watch(args, bureau_extractor, gst_extractor, profiler, llm):
+    output_path = args.output or "extraction_results.json"
+    try:
+        with open(output_path) as f:
+            final_output = json.load(f)
+    except (OSError, ValueError):
+        final_output = {}
+    owners = {}
+
+    def handle(file_path: Path, dtype: str) -> bool:
+        print(f"Processing {file_path} as {dtype}...")
+        key = result_key(file_path, owners)
+        final_output[key] = extract_file(file_path, dtype, bureau_extractor, gst_extractor, profiler, args)
+        with open(output_path, "w") as f:
+            json.dump(final_output, f, indent=2, default=serialize)
+        print(f"Results for {key} saved to {output_path}")
+        return "error" not in final_output[key]
+
+    watcher = FolderWatcher({BUREAU_REPORTS_DIR: "bureau", GST_RETURNS_DIR: "gst"})
+    print(f"Watching {BUREAU_REPORTS_DIR} and {GST_RETURNS_DIR} (Ctrl+C to stop)...")
+    llm.start_heartbeat()
+    try:
+        watcher.run(handle)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        llm.stop_heartbeat()
+
+
+def report_export(exporter: ColumnarExporter):
+    for path in exporter.paths:
+        print(f"Exported {path}")
+    if exporter.skipped:
+        print(f"{exporter.skipped} failed documents are listed in {exporter.errors.path} instead")
+
+
+def merge(args):
+    # --output may be given before or after "merge"
+    output_path = args.merge_output or args.output or "extraction_results.json"
+    results, report = merge_shards(args.shards)
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    export_format = args.merge_export or args.export
+    exporter = export_results(results, Path(args.merge_export_dir or args.export_dir), export_format) \
+        if export_format else None
+
+    for shard in report["shards"]:
+        print(f"Shard {shard['shard']}: {shard['documents']} documents, {shard['errors']} errors, "
+              f"{shard['elapsed_seconds']:.1f}s, {shard['docs_per_sec']:.3f} docs/sec")
+    if report["missing_shards"]:
+        print(f"Missing shards: {', '.join(report['missing_shards'])}")
+    if report["duplicates"]:
+        print(f"{len(report['duplicates'])} documents appeared in more than one shard (kept once)")
+    if report["name_collisions"]:
+        print(f"{len(report['name_collisions'])} different documents share a file name (stored as name#sha256)")
+    print(f"Merged {report['documents']} documents ({report['errors']} errors), "
+          f"{report['docs_per_sec']:.3f} docs/sec overall")
+    print(f"\nResults saved to {output_path}")
+    if exporter:
+        report_export(exporter)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Document Extraction Tool")
     parser.add_argument("--file", type=str, help="Path to PDF file")
     parser.add_argument("--type", type=str, choices=["bureau", "gst", "auto"], default="auto", help="Document type")
     parser.add_argument("--process-all", action="store_true", help="Process all files in data directories")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process new or changed PDFs in the data directories")
+    parser.add_argument("--shard", type=str, default=None,
+                        help="Only process shard i of N (e.g. 0/4), partitioned by file hash")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Results file (default: extraction_results.json, or extraction_results.shard-i-of-N.json)")
+    parser.add_argument("--delay", type=float, default=5.0, help="Seconds to wait between files")
+    parser.add_argument("--profile", action="store_true", help="Capture cProfile/tracemalloc output for each file")
+    parser.add_argument("--profile-dir", type=str, default=None, help="Where profiles are written (default: PROFILE_DIR)")
+    parser.add_argument("--applicant", type=str, default=None,
+                        help="Keep pages in this applicant's persistent store ('auto' uses the GSTIN/PAN in the document)")
+    parser.add_argument("--export", choices=sorted(FORMATS), default=None,
+                        help="Also write bureau parameters and GST sales as columnar tables")
+    parser.add_argument("--export-dir", type=str, default=str(EXPORT_DIR), help="Where exported tables are written")
+    parser.add_argument("--log-level", type=str, default=LOG_LEVEL, help="Logging level (DEBUG, INFO, WARNING, ...)")
+    subparsers = parser.add_subparsers(dest="command")
+    merge_parser = subparsers.add_parser("merge", help="Combine shard result files")
+    merge_parser.add_argument("shards", nargs="+", type=Path, help="Shard result files")
+    merge_parser.add_argument("--output", dest="merge_output", type=str, default=None,
+                              help="Merged results file (default: extraction_results.json)")
+    merge_parser.add_argument("--report", type=str, default=None, help="Also write the merge report (JSON) here")
+    merge_parser.add_argument("--export", dest="merge_export", choices=sorted(FORMATS), default=None,
+                              help="Also write the merged results as columnar tables")
+    merge_parser.add_argument("--export-dir", dest="merge_export_dir", type=str, default=None,
+                              help="Where exported tables are written (default: EXPORT_DIR)")
     args = parser.parse_args()
 
-    llm = LLMEngine() 
-    bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm)
-    gst_extractor = GstExtractor(llm)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(name)s: %(message)s")
+
+    if args.command == "merge":
+        merge(args)
+        return
+
+    if args.watch:
+        if args.export:
+            parser.error("--export writes tables at the end of a run; use it with --process-all, --file or merge, "
+                         "not --watch")
+        llm = LLMEngine()
+        bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm)
+        gst_extractor = GstExtractor(llm, rag=bureau_extractor.rag)
+        profiler = ExtractionProfiler(Path(args.profile_dir)) if args.profile_dir else ExtractionProfiler()
+        watch(args, bureau_extractor, gst_extractor, profiler, llm)
+        return
+
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            print(e)
+            return
 
     results = []
 
@@ -50,45 +182,70 @@ def main():
             return
         dtype = args.type
         if dtype == "auto":
-            if "bureau" in str(f).lower() or "crif" in str(f).lower() or "report" in str(f).lower():
-                dtype = "bureau"
-            elif "gst" in str(f).lower() or "3b" in str(f).lower():
-                dtype = "gst"
-            else:
-                print("Could not auto-detect type. Please specify --type")
+            classification = DocumentClassifier().classify(str(f))
+            if classification.doc_type == "unknown":
+                print(f"Could not auto-detect type (confidence {classification.confidence}). Please specify --type")
                 return
+            dtype = classification.doc_type
+            print(f"Detected {dtype} document (confidence {classification.confidence}, {classification.seconds * 1000:.1f} ms)")
         files_to_process.append((f, dtype))
     else:
         parser.print_help()
         return
 
-    final_output = {}
+    if shard:
+        selected = select_shard(files_to_process, *shard)
+        print(f"Shard {shard[0]}/{shard[1]}: {len(selected)} of {len(files_to_process)} files")
+        files_to_process = [(path, dtype) for path, dtype, _ in selected]
+        output_path = args.output or f"extraction_results.shard-{shard[0]}-of-{shard[1]}.json"
+        shard_writer = ShardWriter(Path(output_path), *shard)
+    else:
+        output_path = args.output or "extraction_results.json"
+        shard_writer = None
+        selected = []
+    digests = {path: digest for path, _, digest in selected}
+    owners = {}
 
-    for file_path, dtype in files_to_process:
-        print(f"Processing {file_path} as {dtype}...")
-        try:
-            if dtype == "bureau":
-                data = bureau_extractor.extract(str(file_path))
-                final_output[file_path.name] = {"bureau_parameters": {k: v.model_dump() for k,v in data.items()}}
-            elif dtype == "gst":
-                data = gst_extractor.extract(str(file_path))
-                final_output[file_path.name] = {"gst_sales": [d.model_dump() for d in data]}
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-            final_output[file_path.name] = {"error": str(e)}
-        
-        import time
-        print("Waiting 5s before next file...")
-        time.sleep(5)
+    llm = LLMEngine() 
+    bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), llm)
+    gst_extractor = GstExtractor(llm, rag=bureau_extractor.rag)
+    profiler = ExtractionProfiler(Path(args.profile_dir)) if args.profile_dir else ExtractionProfiler()
 
-        with open("extraction_results.json", "w") as f:
-            json.dump(final_output, f, indent=2, default=serialize)
-        print(f"Intermediate results saved for {file_path.name}")
+    suffix = f".shard-{shard[0]}-of-{shard[1]}" if shard else ""
+    # tables are published only if the whole run, final writes included, succeeds
+    with (ColumnarExporter(Path(args.export_dir), args.export, suffix) if args.export else nullcontext()) as exporter:
+        final_output = {}
+
+        for position, (file_path, dtype) in enumerate(files_to_process):
+            if position and args.delay > 0:
+                print(f"Waiting {args.delay:g}s before next file...")
+                time.sleep(args.delay)
+
+            print(f"Processing {file_path} as {dtype}...")
+            started = time.perf_counter()
+            key = result_key(file_path, owners, digests.get(file_path))
+            final_output[key] = extract_file(file_path, dtype, bureau_extractor, gst_extractor, profiler, args)
+
+            if shard_writer:
+                shard_writer.add(key, digests[file_path], final_output[key], time.perf_counter() - started)
+                shard_writer.write(default=serialize)
+            else:
+                with open(output_path, "w") as f:
+                    json.dump(final_output, f, indent=2, default=serialize)
+            if exporter:
+                exporter.add(key, final_output[key])
+            print(f"Intermediate results saved for {key}")
+
+        print(json.dumps(final_output, indent=2, default=serialize))
+        if shard_writer:
+            shard_writer.write(default=serialize)
+        else:
+            with open(output_path, "w") as f:
+                json.dump(final_output, f, indent=2, default=serialize)
+        print(f"\nResults saved to {output_path}")
 
-    print(json.dumps(final_output, indent=2, default=serialize))
-    with open("extraction_results.json", "w") as f:
-        json.dump(final_output, f, indent=2, default=serialize)
-    print("\nResults saved to extraction_results.json")
+    if exporter:
+        report_export(exporter)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,210 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # layout: per-bucket counts, then +Inf count, then sum
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = (("le", _format_value(float(bound))),)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, le)} {int(cumulative)}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {int(series[-2])}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {int(series[-2])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._listeners: List[Callable[[str, float, Dict[str, float]], None]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def add_listener(self, listener: Callable[[str, float, Dict[str, float]], None]):
+        """Receive every finished span as (stage, seconds, sizes)."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def record_span(self, stage: str, seconds: float, sizes: Dict[str, float]):
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        for unit, value in sizes.items():
+            STAGE_SIZE.observe(value, stage=stage, unit=unit)
+        for listener in list(self._listeners):
+            listener(stage, seconds, sizes)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "extraction_stage_seconds", "Duration of each pipeline stage in seconds"
+)
+STAGE_SIZE = REGISTRY.histogram(
+    "extraction_stage_size", "Size of the data handled by each pipeline stage", SIZE_BUCKETS
+)
+DOCUMENT_SECONDS = REGISTRY.histogram(
+    "extraction_document_seconds", "End-to-end extraction time per document in seconds"
+)
+DOCUMENTS_TOTAL = REGISTRY.counter(
+    "extraction_documents_total", "Documents processed, by type and status"
+)
+CASCADE_PARAMETERS = REGISTRY.counter(
+    "llm_cascade_parameters_total", "Parameters per tier, by outcome (accepted, escalated, exhausted, calibration)"
+)
+CASCADE_TIER_SECONDS = REGISTRY.histogram(
+    "llm_cascade_tier_seconds", "Duration of each model tier's extraction call(s) in seconds"
+)
+CASCADE_SECONDS = REGISTRY.counter(
+    "llm_cascade_seconds_total", "Time spent across all cascade tiers"
+)
+CASCADE_BASELINE_SECONDS = REGISTRY.counter(
+    "llm_cascade_baseline_seconds_total", "Calibrated time had every document gone straight to the last tier"
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_seconds", "Ollama call latency by model and residency (cold, warm, unknown)"
+)
+LLM_NUM_CTX = REGISTRY.histogram(
+    "llm_num_ctx", "Context window requested per Ollama call", (2048, 4096, 8192, 16384, 32768, 65536)
+)
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "admission_requests_total", "API extraction requests by document type and decision (admitted, rejected)"
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for an extraction slot"
+)
+PAGE_CACHE_LOOKUPS = REGISTRY.counter(
+    "page_text_cache_lookups_total", "Extracted page text cache lookups, by result"
+)
+
+
+class Span:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.sizes: Dict[str, float] = {}
+        self.seconds = 0.0
+
+    def set(self, **sizes):
+        self.sizes.update(sizes)
+
+
+@contextmanager
+def span(stage: str, **sizes):
+    """Time one pipeline stage; sizes (chars, pages, ...) can be added via Span.set."""
+    current = Span(stage)
+    current.set(**sizes)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        REGISTRY.record_span(stage, current.seconds, current.sizes)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s took %.4fs %s", stage, current.seconds, current.sizes)
+
+
+@contextmanager
+def track_document(doc_type: str):
+    start = time.perf_counter()
+    status = "success"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        DOCUMENT_SECONDS.observe(time.perf_counter() - start, doc_type=doc_type)
+        DOCUMENTS_TOTAL.inc(doc_type=doc_type, status=status)
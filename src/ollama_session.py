@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+import requests
+from langchain_community.llms import Ollama
+
+from src.config import (
+    OLLAMA_BASE_URL, LLM_KEEP_ALIVE, LLM_HEARTBEAT_SECONDS, LLM_RESIDENCY_TTL_SECONDS,
+    LLM_NUM_CTX_MIN, LLM_NUM_CTX_MAX, LLM_NUM_PREDICT_RESERVE, LLM_CHARS_PER_TOKEN,
+)
+from src.metrics import LLM_CALL_SECONDS, LLM_NUM_CTX
+
+logger = logging.getLogger(__name__)
+
+
+def context_size(prompt: str, minimum: int = LLM_NUM_CTX_MIN, maximum: int = LLM_NUM_CTX_MAX,
+                 reserve: int = LLM_NUM_PREDICT_RESERVE, chars_per_token: float = LLM_CHARS_PER_TOKEN) -> int:
+    """num_ctx for a prompt: estimated tokens plus room for the answer, rounded up to a power of two.
+
+    Ollama reloads the model whenever num_ctx changes, so sizes are bucketed
+    to keep the number of distinct values (and reloads) small.
+    """
+    needed = int(len(prompt) / chars_per_token) + reserve
+    size = minimum
+    while size < needed and size < maximum:
+        size *= 2
+    return min(size, maximum)
+
+
+class ModelSession:
+    """One Ollama model with managed residency and context sizing.
+
+    Drop-in for the langchain Ollama object (exposes invoke()). Pinned models
+    are loaded with keep_alive=-1 and never unloaded by the server. Residency
+    is sampled at most every residency_ttl seconds (and refreshed by the
+    heartbeat), so calls don't pay for an /api/ps round trip. num_ctx only
+    grows: once a long bureau prompt has raised it, short GST prompts reuse
+    the larger window instead of reloading the model on every switch.
+    """
+
+    def __init__(self, model_name: str, base_url: str = OLLAMA_BASE_URL, keep_alive: str = LLM_KEEP_ALIVE,
+                 pinned: bool = False, temperature: float = 0.1, residency_ttl: float = LLM_RESIDENCY_TTL_SECONDS):
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = -1 if pinned else keep_alive
+        self.pinned = pinned
+        self.llm = Ollama(model=model_name, base_url=self.base_url, temperature=temperature,
+                          keep_alive=self.keep_alive)
+        self.residency_ttl = residency_ttl
+        # high-water num_ctx: every call and warm() use it, so the server only reloads when it grows
+        self.num_ctx = LLM_NUM_CTX_MIN
+        self._residency: Optional[Tuple[str, float]] = None  # (state, checked at)
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        needed = context_size(prompt)
+        with self._lock:
+            reloads = needed > self.num_ctx
+            self.num_ctx = num_ctx = max(needed, self.num_ctx)
+        # a larger num_ctx makes Ollama reload the model, so count it as cold
+        residency = "cold" if reloads else self.residency()
+        LLM_NUM_CTX.observe(num_ctx, model=self.model_name)
+        start = time.perf_counter()
+        response = self.llm.invoke(prompt, num_ctx=num_ctx, **kwargs)
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, model=self.model_name, residency=residency)
+        # the call itself loaded the model
+        self._set_residency("warm")
+        return response
+
+    def residency(self) -> str:
+        """'warm' if the server has the model loaded, 'cold' if not, 'unknown' if it can't say.
+
+        Answers from the last sample while it is younger than residency_ttl.
+        """
+        with self._lock:
+            if self._residency and time.monotonic() - self._residency[1] < self.residency_ttl:
+                return self._residency[0]
+        state = self._check_residency()
+        self._set_residency(state)
+        return state
+
+    def _set_residency(self, state: str):
+        with self._lock:
+            self._residency = (state, time.monotonic())
+
+    def _check_residency(self) -> str:
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=2)
+            response.raise_for_status()
+            loaded = {m.get("name", "") for m in response.json().get("models", [])}
+        except (requests.RequestException, ValueError):
+            return "unknown"
+        wanted = self.model_name if ":" in self.model_name else f"{self.model_name}:latest"
+        return "warm" if wanted in loaded else "cold"
+
+    def warm(self) -> bool:
+        """Loads the model (or refreshes its keep_alive) without generating anything."""
+        with self._lock:
+            num_ctx = self.num_ctx
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model_name, "keep_alive": self.keep_alive, "options": {"num_ctx": num_ctx}},
+                timeout=120,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Could not warm %s: %s", self.model_name, e)
+            self._set_residency(self._check_residency())
+            return False
+        self._set_residency("warm")
+        return True
+
+
+class Heartbeat:
+    """Background thread that keeps sessions resident while the service is up."""
+
+    def __init__(self, sessions: Iterable[ModelSession], interval: float = LLM_HEARTBEAT_SECONDS):
+        self.sessions: List[ModelSession] = list(sessions)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.interval <= 0 or not self.sessions or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="ollama-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info("Ollama heartbeat every %ss for %s", self.interval,
+                    ", ".join(s.model_name for s in self.sessions))
+
+    def _run(self):
+        while True:
+            for session in self.sessions:
+                session.warm()
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def sessions_of(models: Iterable[Any]) -> List[ModelSession]:
+    return [m for m in models if isinstance(m, ModelSession)]
@@ -0,0 +1,206 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pypdf
+
+from src.config import PAGE_CACHE_DIR, PAGE_CACHE_ENABLED, PAGE_CACHE_MAX_MB
+from src.metrics import PAGE_CACHE_LOOKUPS
+from src.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, one zlib blob per page, the index (offset, length per
+# page) and a footer pointing at the index. Writing the index last lets
+# streaming readers append pages as they are extracted.
+MAGIC = b"PTC1"
+INDEX_ENTRY = struct.Struct("<QI")
+FOOTER = struct.Struct("<QI4s")
+COMPRESS_LEVEL = 6
+# API uploads arrive under a new temporary path every time
+MAX_MEMOIZED_HASHES = 4096
+
+
+class CachedPages:
+    """Read-only view over one cached document; pages are decompressed on demand."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+        try:
+            index_offset, count, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+            if magic != MAGIC or self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path.name} is not a page cache file")
+            self._index = [INDEX_ENTRY.unpack_from(self._map, index_offset + i * INDEX_ENTRY.size)
+                           for i in range(count)]
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def text(self, page_number: int) -> str:
+        """1-based, like DocumentChunk.page_number. Pages without text are ''."""
+        offset, length = self._index[page_number - 1]
+        if not length:
+            return ""
+        return zlib.decompress(self._map[offset:offset + length]).decode("utf-8")
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class PageWriter:
+    """Appends pages in order, then publishes the file atomically on commit()."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._file = open(self._tmp, "wb")
+        self._file.write(MAGIC)
+        self._index: List[Tuple[int, int]] = []
+
+    def add(self, text: Optional[str]):
+        if not text:
+            self._index.append((0, 0))
+            return
+        blob = zlib.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+        self._index.append((self._file.tell(), len(blob)))
+        self._file.write(blob)
+
+    def commit(self):
+        index_offset = self._file.tell()
+        for offset, length in self._index:
+            self._file.write(INDEX_ENTRY.pack(offset, length))
+        self._file.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self):
+        try:
+            # close() flushes, which fails again on a full disk
+            self._file.close()
+        except OSError:
+            pass
+        try:
+            os.unlink(self._tmp)
+        except OSError:
+            pass
+
+
+class PageTextCache:
+    """Extracted page text per (file hash, pypdf version), shared by every run.
+
+    Independent of prompts and models, so re-processing an archive after a
+    prompt change skips pypdf entirely. File hashes are memoized per
+    (path, mtime, size) so a hit costs one stat() after the first lookup.
+    Hits refresh a file's mtime, and the least recently used files are
+    evicted before each write once the directory exceeds max_mb.
+    """
+
+    def __init__(self, cache_dir: Path = PAGE_CACHE_DIR, enabled: bool = PAGE_CACHE_ENABLED,
+                 max_mb: float = PAGE_CACHE_MAX_MB):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._hashes: OrderedDict[str, Tuple[Tuple[int, int], str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(file_path)
+            if cached and cached[0] == stamp:
+                self._hashes.move_to_end(file_path)
+                return cached[1]
+        digest = file_sha256(file_path)
+        with self._lock:
+            self._hashes[file_path] = (stamp, digest)
+            self._hashes.move_to_end(file_path)
+            while len(self._hashes) > MAX_MEMOIZED_HASHES:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def path_for(self, file_path: str) -> Path:
+        return self.cache_dir / f"{self._digest(file_path)}-pypdf{pypdf.__version__}.pages"
+
+    def open(self, file_path: str) -> Optional[CachedPages]:
+        """Returns the cached pages, or None on a miss (or when disabled)."""
+        if not self.enabled:
+            return None
+        path = self.path_for(file_path)
+        try:
+            pages = CachedPages(path)
+        except FileNotFoundError:
+            PAGE_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Ignoring unreadable page cache %s: %s", path, e)
+            PAGE_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        PAGE_CACHE_LOOKUPS.inc(result="hit")
+        return pages
+
+    def writer(self, file_path: str) -> Optional[PageWriter]:
+        if not self.enabled:
+            return None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.evict()
+            return PageWriter(self.path_for(file_path))
+        except OSError as e:
+            logger.warning("Page cache not writable: %s", e)
+            return None
+
+    def evict(self) -> int:
+        """Deletes least recently used files until the cache fits max_bytes; returns how many."""
+        if self.max_bytes <= 0:
+            return 0
+        entries = []
+        for path in self.cache_dir.glob("*.pages"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                # readers keep their mapping of an unlinked file
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Evicted %d page cache files from %s", removed, self.cache_dir)
+        return removed
+
+
+PAGE_CACHE = PageTextCache()
@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import PLAN_CACHE_DIR
+from src.dpd import dpd_threshold
+from src.loaders import DataLoader
+from src.metrics import span
+from src.utils import extract_number, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Bump when the compiled layout or prompt template changes so stale cache files are ignored
+PLAN_FORMAT_VERSION = 3
+
+FLAG_PREFIXES = ("whether", "presence", "check", "indicates")
+TRUE_WORDS = {"true", "yes", "y", "present", "1"}
+FALSE_WORDS = {"false", "no", "n", "absent", "none", "0"}
+NULL_WORDS = {"null", "not found", "n/a", "na"}
+
+PROMPT_HEADER = "You are a credit bureau data extraction expert. Extract the following credit parameters from the bureau report text below."
+GROUP_PROMPT_HEADER = "You are a credit bureau data extraction expert. Extract the credit parameters listed after the bureau report text below."
+
+EXTRACTION_RULES = """EXTRACTION RULES:
+1. Look for exact values in the text
+2. For "CIBIL Score": This may appear as "CIBIL Score", "CRIF Score", "CRIF HM Score", or "PERFORM CONSUMER" followed by a score number (typically 300-900 range). Look for patterns like "PERFORM CONSUMER 2.2300-900627" where 627 is the score.
+3. For DPD (Days Past Due): Count total occurrences of delinquency in payment history (look for SMA, SUB, DBT, LSS, or any non-STD status codes)
+4. For "Credit Inquiries": Look in "Enquiry Summary" section or count recent credit inquiries
+5. For "Max Active Loans": Look in "Account Summary" for "Active Accounts" or "Number of Accounts"
+6. For "Total Amount Overdue": Look in "Account Summary" for "Total Amount Overdue" or "Overdue Amt"
+7. For loan counts: Count number of active accounts or loans from account summary
+8. For amounts: Extract numeric values, remove commas and currency symbols
+9. For yes/no questions: Return true/false based on presence of indicators
+10. If you cannot find a value, return null
+11. Return ONLY valid JSON, no explanations
+
+EXTRACTION EXAMPLES:
+- If you see "PERFORM CONSUMER 2.2300-900627", extract 627 as the CIBIL Score
+- If you see "Active Accounts: 25", extract 25 as Max Active Loans
+- If you see "000/STD" in payment history, that means 0 DPD (no delinquency)
+- If you see "030/SMA" or "060/SUB", count those as delinquency days"""
+
+# Parameter groups for LLM_EXECUTION_MODE=grouped, in request order
+GROUP_ORDER = ("score", "dpd", "flag", "amount", "count")
+
+FORMAT_PLACEHOLDERS = {
+    "score": "<number or null>",
+    "count": "<number or null>",
+    "amount": "<number or null>",
+    "flag": "<true/false/null>",
+}
+
+
+def infer_value_type(name: str, description: str) -> str:
+    desc = description.lower().strip()
+    text = f"{name} {description}".lower()
+    if desc.startswith(FLAG_PREFIXES):
+        return "flag"
+    if "score" in name.lower():
+        return "score"
+    if "amount" in text or "exposure" in text:
+        return "amount"
+    return "count"
+
+
+@dataclass(frozen=True)
+class PlanParameter:
+    key: str
+    name: str
+    description: str
+    value_type: str
+    prompt_line: str
+    format_line: str
+    # computed outside the LLM (e.g. "payment_history") and left out of the prompt
+    derived: str = ""
+
+    @property
+    def group(self) -> str:
+        return "dpd" if dpd_threshold(self.name) is not None else self.value_type
+
+    def coerce(self, value: Any) -> Any:
+        """Converts a normalized value to the parameter's type, raising ValueError if it does not fit."""
+        if self.value_type == "flag":
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, (int, float)) and value in (0, 1):
+                return bool(value)
+            word = str(value).strip().lower()
+            if word in TRUE_WORDS:
+                return True
+            if word in FALSE_WORDS:
+                return False
+            raise ValueError(f"{self.name}: expected true/false, got {value!r}")
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{self.name}: expected a number, got {value!r}")
+        if value < 0:
+            raise ValueError(f"{self.name}: negative value {value!r}")
+        if self.value_type == "score":
+            if not 300 <= value <= 900:
+                raise ValueError(f"{self.name}: score {value!r} outside 300-900")
+            return int(value)
+        if self.value_type == "count":
+            if value != int(value):
+                raise ValueError(f"{self.name}: expected a whole number, got {value!r}")
+            return int(value)
+        return float(value)
+
+    def evaluate(self, raw: Any) -> Tuple[Any, float, str]:
+        """Normalizes a raw LLM value into (value, confidence, source)."""
+        if isinstance(raw, str):
+            word = raw.strip().lower()
+            if word in NULL_WORDS:
+                return None, 0.0, "Not Found"
+            num = extract_number(raw)
+            if self.value_type == "flag" and word in TRUE_WORDS | FALSE_WORDS:
+                # "true"/"yes" is as clear an answer as a JSON boolean
+                value, confidence = word in TRUE_WORDS, 0.90
+            elif num is not None and len(raw) < 20:
+                value, confidence = num, 0.85
+            else:
+                value, confidence = raw, 0.75
+        elif isinstance(raw, (int, float)):
+            value, confidence = raw, 0.90
+        elif raw is None:
+            return None, 0.0, "Not Found"
+        else:
+            value, confidence = raw, 0.70
+
+        try:
+            return self.coerce(value), confidence, "Bureau Report - RAG Analysis"
+        except ValueError as e:
+            logger.debug("Validation failed: %s", e)
+            return None, 0.0, "Failed Validation"
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    source_hash: str
+    parameters: Tuple[PlanParameter, ...]
+    prompt_prefix: str
+    prompt_suffix: str
+    # grouped mode: one shared prefix (instructions + document) and a tail per group
+    group_prefix: str = ""
+    group_suffixes: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(p.name for p in self.parameters)
+
+    @property
+    def llm_parameters(self) -> Tuple[PlanParameter, ...]:
+        return tuple(p for p in self.parameters if not p.derived)
+
+    def get(self, name: str) -> Optional[PlanParameter]:
+        for param in self.parameters:
+            if param.name == name:
+                return param
+        return None
+
+    def subset(self, names) -> "ExtractionPlan":
+        """Plan restricted to `names`, e.g. the parameters escalated to the next model."""
+        wanted = set(names)
+        return assemble_plan(tuple(p for p in self.parameters if p.name in wanted), self.source_hash)
+
+    def build_prompt(self, context: str) -> str:
+        # Everything that depends only on the sheet comes first, so the model
+        # server can reuse its cached prefix across documents.
+        return self.prompt_prefix + context + self.prompt_suffix
+
+    @property
+    def groups(self) -> Tuple[str, ...]:
+        return tuple(group for group, _ in self.group_suffixes)
+
+    def group_parameters(self, group: str) -> Tuple[PlanParameter, ...]:
+        return tuple(p for p in self.llm_parameters if p.group == group)
+
+    def build_group_prompt(self, context: str, group: str) -> str:
+        # The document sits before the group-specific tail so every group
+        # call shares the same (cacheable) prompt prefix.
+        return self.group_prefix + context + dict(self.group_suffixes)[group]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PLAN_FORMAT_VERSION,
+            "source_hash": self.source_hash,
+            "parameters": [asdict(p) for p in self.parameters],
+            "prompt_prefix": self.prompt_prefix,
+            "prompt_suffix": self.prompt_suffix,
+            "group_prefix": self.group_prefix,
+            "group_suffixes": [list(pair) for pair in self.group_suffixes],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExtractionPlan":
+        return cls(
+            source_hash=data["source_hash"],
+            parameters=tuple(PlanParameter(**p) for p in data["parameters"]),
+            prompt_prefix=data["prompt_prefix"],
+            prompt_suffix=data["prompt_suffix"],
+            group_prefix=data.get("group_prefix", ""),
+            group_suffixes=tuple(tuple(pair) for pair in data.get("group_suffixes", ())),
+        )
+
+
+def compile_plan(records: List[Dict], source_hash: str = "") -> ExtractionPlan:
+    """Compiles parameter sheet rows (as returned by DataLoader.load_excel_parameters)."""
+    parameters = []
+    for record in records:
+        name = record.get('parameter name', record.get('parameter', 'Unknown'))
+        description = record.get('description', name)
+        key = record.get('parameter id') or name
+        value_type = infer_value_type(name, description)
+        parameters.append(PlanParameter(
+            key=key,
+            name=name,
+            description=description,
+            value_type=value_type,
+            prompt_line=f'- "{name}": {description}',
+            format_line=f'  "{name}": {FORMAT_PLACEHOLDERS[value_type]}',
+            derived="payment_history" if dpd_threshold(name) is not None else "",
+        ))
+
+    return assemble_plan(tuple(parameters), source_hash)
+
+
+def assemble_plan(parameters: Tuple[PlanParameter, ...], source_hash: str = "") -> ExtractionPlan:
+    """Renders the prompt templates for already-typed parameters."""
+    prompted = [p for p in parameters if not p.derived]
+    params_text = '\n'.join(p.prompt_line for p in prompted)
+    output_format = '{\n' + ',\n'.join(p.format_line for p in prompted) + '\n}'
+    prompt_prefix = f"""{PROMPT_HEADER}
+
+PARAMETERS TO EXTRACT:
+{params_text}
+
+{EXTRACTION_RULES}
+
+OUTPUT FORMAT (JSON only):
+{output_format}
+
+BUREAU REPORT TEXT:
+"""
+    prompt_suffix = "\n\nRESPOND WITH JSON ONLY:"
+
+    group_prefix = f"""{GROUP_PROMPT_HEADER}
+
+{EXTRACTION_RULES}
+
+BUREAU REPORT TEXT:
+"""
+    group_suffixes = []
+    for group in GROUP_ORDER:
+        members = [p for p in prompted if p.group == group]
+        if not members:
+            continue
+        group_params = '\n'.join(p.prompt_line for p in members)
+        group_format = '{\n' + ',\n'.join(p.format_line for p in members) + '\n}'
+        group_suffixes.append((group, f"""
+
+PARAMETERS TO EXTRACT:
+{group_params}
+
+OUTPUT FORMAT (JSON only):
+{group_format}{prompt_suffix}"""))
+
+    return ExtractionPlan(
+        source_hash=source_hash,
+        parameters=parameters,
+        prompt_prefix=prompt_prefix,
+        prompt_suffix=prompt_suffix,
+        group_prefix=group_prefix,
+        group_suffixes=tuple(group_suffixes),
+    )
+
+
+def plan_from_descriptions(parameters: Dict[str, str]) -> ExtractionPlan:
+    """Builds an uncached plan from a {name: description} dict."""
+    return compile_plan([{'parameter name': k, 'description': v} for k, v in parameters.items()])
+
+
+class PlanCache:
+    """Keeps the compiled plan for a parameter sheet, reloading when the file changes.
+
+    The common path is a single stat() call. When mtime or size moves, the
+    file is hashed; an unchanged hash keeps the current plan, a known hash is
+    loaded from the on-disk cache, and anything else is recompiled.
+    """
+
+    def __init__(self, cache_dir: Path = PLAN_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._plans: Dict[str, Tuple[Tuple[int, int], ExtractionPlan]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, excel_path: str) -> ExtractionPlan:
+        """A missing or unreadable sheet is logged and gives the last good plan, or an empty one."""
+        with self._lock:
+            cached = self._plans.get(excel_path)
+            try:
+                stat = os.stat(excel_path)
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if cached and cached[0] == stamp:
+                    return cached[1]
+                digest = file_sha256(excel_path)
+            except OSError as e:
+                logger.error("Error loading Excel: %s", e)
+                # not remembered, so the sheet is picked up as soon as it is readable again
+                return cached[1] if cached else compile_plan([])
+
+            if cached and cached[1].source_hash == digest:
+                plan = cached[1]
+            else:
+                plan = self._load_or_compile(excel_path, digest)
+            self._plans[excel_path] = (stamp, plan)
+            return plan
+
+    def _cache_file(self, digest: str) -> Path:
+        return self.cache_dir / f"plan-v{PLAN_FORMAT_VERSION}-{digest}.json"
+
+    def _load_or_compile(self, excel_path: str, digest: str) -> ExtractionPlan:
+        cache_file = self._cache_file(digest)
+        if cache_file.exists():
+            try:
+                plan = ExtractionPlan.from_dict(json.loads(cache_file.read_text()))
+                logger.info("Loaded extraction plan %s from cache", digest[:12])
+                return plan
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Ignoring unreadable plan cache %s: %s", cache_file, e)
+
+        with span("compile_plan"):
+            plan = compile_plan(DataLoader.load_excel_parameters(excel_path), digest)
+        if not plan.parameters:
+            return plan
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = cache_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(plan.to_dict()))
+            os.replace(tmp, cache_file)
+        except OSError as e:
+            logger.warning("Could not write plan cache %s: %s", cache_file, e)
+        logger.info("Compiled extraction plan %s with %d parameters", digest[:12], len(plan.parameters))
+        return plan
@@ -0,0 +1,124 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.config import PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_TOP_N, PROFILE_TRACEMALLOC_FRAMES
+from src.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionProfiler:
+    """Wraps an extraction in cProfile and tracemalloc.
+
+    Output goes to <output_dir>/<document sha256>/<timestamp>.* so repeated
+    runs over the same document sit next to each other. Requests are profiled
+    when forced (CLI flag / API header) or with probability `sample_rate`.
+    Only one extraction is profiled at a time, since both profilers are
+    process-wide; concurrent requests simply run unprofiled.
+
+    cProfile only sees the thread that enables it, so threads started while a
+    profile is running (e.g. the grouped LLM workers) get their own profiler
+    via threading.setprofile, and their stats are merged into the output.
+    Threads that were already running, such as a reused pool, are not traced.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path = PROFILE_DIR,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        top_n: int = PROFILE_TOP_N,
+        tracemalloc_frames: int = PROFILE_TRACEMALLOC_FRAMES,
+    ):
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.tracemalloc_frames = tracemalloc_frames
+        self._lock = threading.Lock()
+
+    def should_profile(self, forced: bool = False) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, file_path: str, label: str = "extract", forced: bool = False):
+        """Yields the output directory when profiling, otherwise None."""
+        if not self.should_profile(forced) or not self._lock.acquire(blocking=False):
+            yield None
+            return
+        try:
+            doc_dir = self.output_dir / file_sha256(file_path)
+            doc_dir.mkdir(parents=True, exist_ok=True)
+            # the random suffix keeps two profiles of one document in the same second apart
+            stem = doc_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}-{label}"
+
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(self.tracemalloc_frames)
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            thread_profilers = []
+
+            def profile_thread(frame, event, arg):
+                # first event in a new thread: hand the thread over to its own cProfile
+                thread_profiler = cProfile.Profile()
+                thread_profilers.append(thread_profiler)
+                thread_profiler.enable()
+
+            start = time.perf_counter()
+            threading.setprofile(profile_thread)
+            profiler.enable()
+            try:
+                yield doc_dir
+            finally:
+                profiler.disable()
+                threading.setprofile(None)
+                elapsed = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                stats = pstats.Stats(profiler)
+                for thread_profiler in list(thread_profilers):
+                    stats.add(thread_profiler)
+                self._write(stem, file_path, stats, len(thread_profilers), snapshot, elapsed, current, peak)
+        finally:
+            self._lock.release()
+
+    def _write(self, stem: Path, file_path: str, stats: pstats.Stats, threads: int,
+               snapshot: tracemalloc.Snapshot, elapsed: float, current: int, peak: int):
+        stats.dump_stats(str(stem) + ".pstats")
+
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats("cumulative").print_stats(self.top_n)
+        Path(str(stem) + ".profile.txt").write_text(buffer.getvalue())
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        top = snapshot.statistics("lineno")[:self.top_n]
+        Path(str(stem) + ".alloc.txt").write_text("\n".join(str(stat) for stat in top) + "\n")
+
+        summary = {
+            "source_file": Path(file_path).name,
+            "elapsed_seconds": round(elapsed, 4),
+            "worker_threads_profiled": threads,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top_allocations": [
+                {"site": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                for stat in top[:10]
+            ],
+        }
+        Path(str(stem) + ".json").write_text(json.dumps(summary, indent=2))
+        logger.info("Profile for %s written to %s.*", summary["source_file"], stem)
@@ -1,14 +1,82 @@
-from typing import List
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import chromadb
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document as LangchainDocument
 from src.loaders import DocumentChunk
-from src.config import EMBEDDING_MODEL_NAME
+from src.config import (
+    EMBEDDING_MODEL_NAME, CHROMA_PERSIST_DIR, CHROMA_NAMESPACE_TTL_DAYS, CHROMA_TOUCH_INTERVAL,
+    CHROMA_GC_INTERVAL_SECONDS,
+)
+from src.metrics import span
+
+logger = logging.getLogger(__name__)
+
+GSTIN = re.compile(r"\b(\d{2}[A-Z]{5}\d{4}[A-Z][0-9A-Z]Z[0-9A-Z])\b")
+PAN = re.compile(r"\b([A-Z]{5}\d{4}[A-Z])\s*\[PAN\]")
+GST_PERIOD = re.compile(r"Year\s+(\d{4})-(\d{2}).*?Period\s+([A-Za-z]+)", re.DOTALL)
+ISSUE_DATE = re.compile(r"Date of Issue:\s*\d{2}-(\d{2})-(\d{4})")
+MONTHS = ["january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december"]
+
+
+def derive_namespace(text: str) -> Optional[str]:
+    """GSTIN for GST returns, PAN for bureau reports."""
+    gstin = GSTIN.search(text)
+    if gstin:
+        return gstin.group(1)
+    pan = PAN.search(text)
+    return pan.group(1) if pan else None
+
+
+def document_period(text: str) -> str:
+    """Return period as YYYY-MM (GSTR-3B tax period or bureau issue month), or ""."""
+    gst = GST_PERIOD.search(text)
+    if gst and gst.group(3).lower() in MONTHS:
+        month = MONTHS.index(gst.group(3).lower()) + 1
+        # financial year 2024-25 runs April 2024 to March 2025
+        year = int(gst.group(1)) if month >= 4 else int(gst.group(1)[:2] + gst.group(2))
+        return f"{year:04d}-{month:02d}"
+    issued = ISSUE_DATE.search(text)
+    if issued:
+        return f"{issued.group(2)}-{issued.group(1)}"
+    return ""
 
 class RAGEngine:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    def __init__(self, embeddings=None, collection_name: str = "temp_doc_collection", client=None):
+        # to run several engines in one process, pass shared embeddings, a shared
+        # chromadb client (creating clients from many threads at once races) and
+        # distinct collection names
+        self.embeddings = embeddings or HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        self.collection_name = collection_name
+        self.client = client or chromadb.EphemeralClient()
         self.vector_store = None
+        # streaming mode: page numbers and embeddings only, no text
+        self.page_index = None
+        self._applicant_store = None
+
+    def scoped(self) -> "RAGEngine":
+        """A throwaway engine on its own collection, sharing the embeddings and client.
+
+        Lets concurrent extractions index documents without clearing each other's pages.
+        """
+        return RAGEngine(self.embeddings, collection_name=f"{self.collection_name}-{uuid.uuid4().hex[:12]}",
+                         client=self.client)
+
+    @property
+    def applicant_store(self) -> "ApplicantStore":
+        if self._applicant_store is None:
+            self._applicant_store = ApplicantStore(self.embeddings)
+        return self._applicant_store
 
     def index_document(self, chunks: List[DocumentChunk]):
         documents = [
@@ -18,18 +86,251 @@ class RAGEngine:
             ) for chunk in chunks
         ]
         
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            collection_name="temp_doc_collection"
-        )
+        # drop whatever a previous document left behind if its clear() never ran
+        self.clear()
+        run = uuid.uuid4().hex
+        with span("index_document", documents=len(documents), chars=sum(len(d.page_content) for d in documents)):
+            self.vector_store = Chroma.from_documents(
+                documents=documents,
+                embedding=self.embeddings,
+                ids=[f"{run}:{i}" for i in range(len(documents))],
+                collection_name=self.collection_name,
+                client=self.client
+            )
+
+    def index_stream(self, chunks: Iterable[DocumentChunk], window: int = 16) -> int:
+        """Embeds and indexes pages in windows, storing only page metadata.
+
+        Page text is dropped once its window is embedded; callers re-read the
+        winning pages from the PDF via retrieve_pages().
+        """
+        self.clear()
+        self.page_index = self.client.create_collection(self.collection_name)
+        run = uuid.uuid4().hex
+        indexed = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= window:
+                indexed += self._add_window(run, batch)
+                batch = []
+        if batch:
+            indexed += self._add_window(run, batch)
+        return indexed
+
+    def _add_window(self, run: str, batch: List[DocumentChunk]) -> int:
+        with span("index_document", documents=len(batch), chars=sum(len(c.text) for c in batch)):
+            vectors = self.embeddings.embed_documents([c.text for c in batch])
+            self.page_index.add(
+                ids=[f"{run}:{c.page_number}" for c in batch],
+                embeddings=vectors,
+                metadatas=[{"page": c.page_number, "source": c.source_file} for c in batch],
+            )
+        return len(batch)
+
+    def retrieve_pages(self, query: str, k: int = 3) -> List[int]:
+        if not self.page_index:
+            return []
+        with span("retrieve", k=k) as s:
+            vector = self.embeddings.embed_query(query)
+            result = self.page_index.query(
+                query_embeddings=[vector], n_results=k, include=["metadatas"]
+            )
+            pages = [m["page"] for m in result["metadatas"][0]]
+            s.set(documents=len(pages))
+        return pages
 
     def retrieve(self, query: str, k: int = 3) -> List[LangchainDocument]:
         if not self.vector_store:
             return []
-        return self.vector_store.similarity_search(query, k=k)
+        with span("retrieve", k=k) as s:
+            docs = self.vector_store.similarity_search(query, k=k)
+            s.set(documents=len(docs))
+        return docs
 
     def clear(self):
-        if self.vector_store:
-            self.vector_store.delete_collection()
-            self.vector_store = None
+        self.vector_store = None
+        self.page_index = None
+        try:
+            self.client.delete_collection(self.collection_name)
+        except chromadb.errors.NotFoundError:
+            pass
+
+
+class ApplicantStore:
+    """Persistent vector store with one Chroma collection per applicant/GSTIN.
+
+    Documents are keyed by file hash, so adding a report that is already in
+    the namespace costs one lookup instead of re-embedding it. A document
+    only counts as indexed once all its pages are in (recorded in the
+    registry), so an interrupted add is finished on the next attempt.
+    Namespaces not touched for `ttl_days` are dropped by gc(), at start-up
+    and then at most every `gc_interval` seconds as the store is used.
+    """
+
+    def __init__(self, embeddings, persist_dir: Path = CHROMA_PERSIST_DIR,
+                 ttl_days: float = CHROMA_NAMESPACE_TTL_DAYS, touch_interval: float = CHROMA_TOUCH_INTERVAL,
+                 gc_interval: float = CHROMA_GC_INTERVAL_SECONDS):
+        self.embeddings = embeddings
+        self.persist_dir = Path(persist_dir)
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=str(self.persist_dir))
+        self.ttl_days = ttl_days
+        self.touch_interval = touch_interval
+        self.gc_interval = gc_interval
+        # namespace -> when its last access was last written to the registry
+        self._persisted_access: Dict[str, float] = {}
+        # namespace -> last access in this process, which gc() honours even if not yet persisted
+        self._accessed: Dict[str, float] = {}
+        self._next_gc = 0.0
+        self.registry_path = self.persist_dir / "namespaces.json"
+        self._stores: Dict[str, Chroma] = {}
+        self._lock = threading.Lock()
+        if ttl_days > 0:
+            self.gc()
+
+    @staticmethod
+    def collection_name(namespace: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9_-]", "_", namespace)[:40]
+        digest = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:10]
+        return f"ns-{slug}-{digest}"
+
+    def store(self, namespace: str) -> Chroma:
+        with self._lock:
+            self._accessed[namespace] = time.time()
+            if namespace not in self._stores:
+                self._stores[namespace] = Chroma(
+                    client=self.client,
+                    collection_name=self.collection_name(namespace),
+                    embedding_function=self.embeddings,
+                )
+            return self._stores[namespace]
+
+    def has_document(self, namespace: str, doc_hash: str) -> bool:
+        with self._lock:
+            entry = self._read_registry().get(namespace, {})
+        return doc_hash in entry.get("complete", [])
+
+    def add_document(self, namespace: str, chunks: Iterable[DocumentChunk], doc_hash: str,
+                     doc_type: str, window: int = 16) -> int:
+        """Embeds a document into the namespace unless it is already there.
+
+        `chunks` is always consumed, so callers can hang per-page work on it.
+        Returns the number of pages embedded (0 when already indexed).
+        """
+        if self.has_document(namespace, doc_hash):
+            for _ in chunks:
+                pass
+            self._touch(namespace)
+            return 0
+
+        store = self.store(namespace)
+        period = None
+        added = 0
+        batch = []
+
+        def flush():
+            with span("index_document", documents=len(batch), chars=sum(len(c.text) for c in batch)):
+                store.add_texts(
+                    texts=[c.text for c in batch],
+                    metadatas=[{
+                        "page": c.page_number,
+                        "source": c.source_file,
+                        "doc_hash": doc_hash,
+                        "doc_type": doc_type,
+                        "period": period,
+                    } for c in batch],
+                    ids=[f"{doc_hash}:{c.page_number}" for c in batch],
+                )
+
+        for chunk in chunks:
+            if period is None:
+                period = document_period(chunk.text)
+            batch.append(chunk)
+            if len(batch) >= window:
+                flush()
+                added += len(batch)
+                batch = []
+        if batch:
+            flush()
+            added += len(batch)
+        # ids are per page and add_texts upserts, so finishing a partial add is idempotent
+        self._touch(namespace, completed=doc_hash)
+        return added
+
+    def search(self, namespace: str, query: str, k: int = 3, doc_hash: Optional[str] = None,
+               doc_type: Optional[str] = None, period: Optional[str] = None) -> List[LangchainDocument]:
+        conditions = [
+            {key: value} for key, value in
+            (("doc_hash", doc_hash), ("doc_type", doc_type), ("period", period))
+            if value
+        ]
+        where = None
+        if len(conditions) == 1:
+            where = conditions[0]
+        elif conditions:
+            where = {"$and": conditions}
+        with span("retrieve", k=k) as s:
+            docs = self.store(namespace).similarity_search(query, k=k, filter=where)
+            s.set(documents=len(docs))
+        self._touch(namespace)
+        return docs
+
+    def gc(self, ttl_days: Optional[float] = None) -> List[str]:
+        """Deletes namespaces not used within the TTL; returns the removed names."""
+        ttl = self.ttl_days if ttl_days is None else ttl_days
+        now = time.time()
+        cutoff = now - ttl * 86400
+        removed = []
+        with self._lock:
+            self._next_gc = now + self.gc_interval
+            registry = self._read_registry()
+            for namespace, entry in list(registry.items()):
+                if max(entry.get("last_access", 0), self._accessed.get(namespace, 0)) >= cutoff:
+                    continue
+                try:
+                    self.client.delete_collection(self.collection_name(namespace))
+                except Exception as e:
+                    logger.debug("Collection for %s already gone: %s", namespace, e)
+                self._stores.pop(namespace, None)
+                self._persisted_access.pop(namespace, None)
+                self._accessed.pop(namespace, None)
+                del registry[namespace]
+                removed.append(namespace)
+            if removed:
+                self._write_registry(registry)
+        if removed:
+            logger.info("Removed %d stale namespaces", len(removed))
+        return removed
+
+    def _touch(self, namespace: str, completed: Optional[str] = None):
+        now = time.time()
+        self._maybe_gc(now)
+        with self._lock:
+            self._accessed[namespace] = now
+            if completed is None and now - self._persisted_access.get(namespace, 0) < self.touch_interval:
+                return
+            registry = self._read_registry()
+            entry = registry.setdefault(namespace, {})
+            entry["last_access"] = now
+            if completed:
+                entry["complete"] = sorted(set(entry.get("complete", [])) | {completed})
+            entry["documents"] = len(entry.get("complete", []))
+            self._write_registry(registry)
+            self._persisted_access[namespace] = now
+
+    def _maybe_gc(self, now: float):
+        # long-running processes (API, --watch) build the store once, so the TTL sweep rides on its use
+        if self.ttl_days > 0 and self.gc_interval > 0 and now >= self._next_gc:
+            self.gc()
+
+    def _read_registry(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self.registry_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_registry(self, registry: Dict[str, dict]):
+        tmp = self.registry_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(registry, indent=2))
+        os.replace(tmp, self.registry_path)
@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 def clean_text(text: str) -> str:
@@ -17,3 +18,10 @@ def extract_number(text: str) -> float | None:
         except ValueError:
             return None
     return None
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.config import (
+    WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS, WATCH_STATE_FILE, WATCH_RETRY_SECONDS, WATCH_RETRY_MAX_SECONDS,
+)
+from src.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+Stamp = Tuple[int, int]
+
+
+class FolderWatcher:
+    """Polls directories for new or changed PDFs and hands over only the delta.
+
+    A file is ready once its (mtime, size) has not moved for settle_seconds,
+    so uploads still being written are left alone. Processed files are
+    recorded in a JSON state file with their hash; a file that is touched but
+    not changed is not processed again, across restarts too. Failed files are
+    retried with exponential backoff (retry_seconds, doubling up to
+    retry_max_seconds) until they succeed or change.
+    """
+
+    def __init__(self, directories: Dict[Path, str], state_path: Path = WATCH_STATE_FILE,
+                 poll_seconds: float = WATCH_POLL_SECONDS, settle_seconds: float = WATCH_SETTLE_SECONDS,
+                 retry_seconds: float = WATCH_RETRY_SECONDS, retry_max_seconds: float = WATCH_RETRY_MAX_SECONDS):
+        self.directories = {Path(d): dtype for d, dtype in directories.items()}
+        self.state_path = Path(state_path)
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.state: Dict[str, dict] = self._load_state()
+        # path -> (stamp, first time that stamp was seen)
+        self._pending: Dict[str, Tuple[Stamp, float]] = {}
+
+    def _load_state(self) -> Dict[str, dict]:
+        try:
+            return json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp, self.state_path)
+
+    def scan(self, now: Optional[float] = None) -> List[Tuple[Path, str]]:
+        """Returns the (path, doc type) pairs that are new or changed and have settled."""
+        now = time.monotonic() if now is None else now
+        wall = time.time()
+        ready = []
+        seen = set()
+        for directory, dtype in self.directories.items():
+            if not directory.exists():
+                continue
+            for path in sorted(directory.glob("*.pdf")):
+                key = str(path)
+                seen.add(key)
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                recorded = self.state.get(key)
+                if recorded and (recorded["mtime_ns"], recorded["size"]) == stamp:
+                    self._pending.pop(key, None)
+                    if not recorded.get("ok", True) and wall >= recorded.get("retry_at", 0):
+                        ready.append((path, dtype))
+                    continue
+                pending = self._pending.get(key)
+                if not pending or pending[0] != stamp:
+                    self._pending[key] = (stamp, now)
+                    continue
+                if now - pending[1] < self.settle_seconds:
+                    continue
+                del self._pending[key]
+                if recorded and recorded.get("sha256") == file_sha256(key):
+                    # touched or copied over with identical content: keep its outcome and retry schedule
+                    self.state[key].update(mtime_ns=stamp[0], size=stamp[1])
+                    self._save_state()
+                    if not recorded.get("ok", True) and wall >= recorded.get("retry_at", 0):
+                        ready.append((path, dtype))
+                    continue
+                ready.append((path, dtype))
+        for key in list(self._pending):
+            if key not in seen:
+                del self._pending[key]
+        return ready
+
+    def snapshot(self, path: Path) -> Optional[Tuple[Stamp, str]]:
+        """(stamp, sha256) taken before processing, so edits made meanwhile are picked up next scan."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size), file_sha256(str(path))
+
+    def mark_done(self, path: Path, snapshot: Tuple[Stamp, str], ok: bool = True):
+        key = str(path)
+        (mtime_ns, size), digest = snapshot
+        entry = {
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "sha256": digest,
+            "ok": ok,
+            "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if not ok:
+            previous = self.state.get(key, {})
+            failures = previous.get("failures", 0) + 1 if previous.get("sha256") == digest else 1
+            delay = min(self.retry_max_seconds, self.retry_seconds * 2 ** (failures - 1))
+            entry.update(failures=failures, retry_at=time.time() + delay)
+            logger.warning("%s failed (%d in a row), retrying in %.0fs", path.name, failures, delay)
+        self.state[key] = entry
+        self._save_state()
+
+    def run(self, handler: Callable[[Path, str], bool], stop: Optional[threading.Event] = None):
+        """Calls handler(path, doc type) for each ready file until `stop` is set.
+
+        handler returns True on success; a False return or an exception counts
+        as a failure and is retried with backoff. Files interrupted by
+        KeyboardInterrupt (or a crash) are not recorded, so they are picked up
+        again on the next start.
+        """
+        stop = stop or threading.Event()
+        logger.info("Watching %s", ", ".join(str(d) for d in self.directories))
+        while not stop.is_set():
+            for path, dtype in self.scan():
+                snapshot = self.snapshot(path)
+                if snapshot is None:
+                    continue
+                try:
+                    ok = handler(path, dtype)
+                except Exception:
+                    logger.exception("Processing %s failed", path)
+                    ok = False
+                self.mark_done(path, snapshot, ok)
+                if stop.is_set():
+                    return
+            stop.wait(self.poll_seconds)
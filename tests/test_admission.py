@@ -0,0 +1,84 @@
+"""Admission budgets: queue bounds, wait estimates and the concurrency limit."""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.admission import AdmissionController, Budget, Overloaded
+
+
+def test_rejects_when_the_queue_is_full():
+    budget = Budget("test", concurrency=2, max_queue=1, max_wait=1000, initial_latency=10.0)
+    tickets = [budget.admit() for _ in range(3)]  # two running, one queued
+    with pytest.raises(Overloaded) as rejected:
+        budget.admit()
+    assert rejected.value.kind == "test"
+    assert rejected.value.retry_after >= 1.0
+
+    tickets[0].release()
+    tickets[0].release()  # releasing twice frees one place only
+    assert budget.in_flight == 2
+    budget.admit()
+    assert budget.in_flight == 3
+
+
+def test_rejects_when_the_estimated_wait_is_too_long():
+    budget = Budget("test", concurrency=1, max_queue=100, max_wait=15, initial_latency=10.0)
+    budget.admit()
+    assert budget.estimated_wait(budget.in_flight) == 10.0
+    budget.admit()
+    assert budget.estimated_wait(budget.in_flight) == 20.0
+    with pytest.raises(Overloaded) as rejected:
+        budget.admit()
+    assert rejected.value.retry_after == pytest.approx(10.0)
+
+
+def test_ticket_context_manager_releases():
+    budget = Budget("test", concurrency=1, max_queue=0, max_wait=1000, initial_latency=1.0)
+    with budget.admit():
+        assert budget.in_flight == 1
+    assert budget.in_flight == 0
+
+
+def test_run_limits_concurrency_and_learns_latency():
+    budget = Budget("test", concurrency=2, max_queue=10, max_wait=1000, initial_latency=10.0, alpha=0.5)
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return threading.current_thread() is not threading.main_thread()
+
+    async def request():
+        with budget.admit() as ticket:
+            return await ticket.run(work)
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(6)))
+
+    assert all(asyncio.run(main()))
+    assert peak == 2
+    assert budget.in_flight == 0
+    assert budget.latency < 1.0
+
+
+def test_controller_keeps_document_types_apart():
+    controller = AdmissionController({
+        "bureau": Budget("bureau", 1, 0, 1000, initial_latency=30.0),
+        "gst": Budget("gst", 1, 0, 1000, initial_latency=5.0),
+    })
+    controller.admit("bureau")
+    with pytest.raises(Overloaded):
+        controller.admit("bureau")
+    controller.admit("gst")
@@ -0,0 +1,85 @@
+"""Applicant namespaces: completion markers, retrieval scoping and TTL sweeps."""
+import json
+import os
+import sys
+import time
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.loaders import DocumentChunk
+from src.rag import ApplicantStore
+
+
+def pages(source: str, *texts: str):
+    return [DocumentChunk(text=text, page_number=i, source_file=source) for i, text in enumerate(texts, start=1)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ApplicantStore(FakeEmbeddings(size=16), persist_dir=tmp_path, ttl_days=30, touch_interval=300)
+
+
+def test_document_is_complete_only_after_its_last_page(store):
+    def interrupted():
+        yield from pages("a.pdf", "page one", "page two")
+        raise RuntimeError("killed mid-document")
+
+    with pytest.raises(RuntimeError):
+        store.add_document("ns", interrupted(), "hash-a", "bureau", window=1)
+    assert not store.has_document("ns", "hash-a")
+
+    assert store.add_document("ns", pages("a.pdf", "page one", "page two", "page three"), "hash-a", "bureau") == 3
+    assert store.has_document("ns", "hash-a")
+    assert store.add_document("ns", pages("a.pdf", "page one"), "hash-a", "bureau") == 0
+
+
+def test_search_filters_by_document_and_type(store):
+    store.add_document("ns", pages("a.pdf", "report A score", "report A accounts"), "hash-a", "bureau")
+    store.add_document("ns", pages("b.pdf", "report B score"), "hash-b", "bureau")
+    store.add_document("ns", pages("g.pdf", "GST return sales"), "hash-g", "gst")
+
+    own = store.search("ns", "score", k=5, doc_hash="hash-b", doc_type="bureau")
+    assert {d.metadata["doc_hash"] for d in own} == {"hash-b"}
+    bureau = store.search("ns", "score", k=5, doc_type="bureau")
+    assert {d.metadata["doc_hash"] for d in bureau} == {"hash-a", "hash-b"}
+
+
+def test_search_does_not_rewrite_the_registry_every_time(store):
+    store.add_document("ns", pages("a.pdf", "text"), "hash-a", "bureau")
+    before = store.registry_path.stat().st_mtime_ns
+    time.sleep(0.01)
+    store.search("ns", "text")
+    assert store.registry_path.stat().st_mtime_ns == before
+
+
+def test_stale_namespaces_are_swept_while_the_store_is_in_use(tmp_path):
+    store = ApplicantStore(FakeEmbeddings(size=16), persist_dir=tmp_path, ttl_days=1, gc_interval=3600)
+    store.add_document("old", pages("a.pdf", "text"), "hash-a", "bureau")
+    store.add_document("fresh", pages("b.pdf", "text"), "hash-b", "bureau")
+
+    # "old" was last used two days ago by another process
+    registry = json.loads(store.registry_path.read_text())
+    registry["old"]["last_access"] = time.time() - 2 * 86400
+    store.registry_path.write_text(json.dumps(registry))
+    store._accessed.pop("old")
+
+    store.search("fresh", "text")
+    assert "old" in json.loads(store.registry_path.read_text())  # not due yet
+
+    store._next_gc = 0
+    store.search("fresh", "text")
+    registry = json.loads(store.registry_path.read_text())
+    assert "old" not in registry and "fresh" in registry
+
+
+def test_namespace_used_in_this_process_survives_the_sweep(tmp_path):
+    store = ApplicantStore(FakeEmbeddings(size=16), persist_dir=tmp_path, ttl_days=1)
+    store.add_document("ns", pages("a.pdf", "text"), "hash-a", "bureau")
+    registry = json.loads(store.registry_path.read_text())
+    registry["ns"]["last_access"] = time.time() - 2 * 86400
+    store.registry_path.write_text(json.dumps(registry))
+
+    assert store.gc() == []
@@ -0,0 +1,79 @@
+"""Shard selection, result keys and merging of shard files."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.batch import ShardWriter, merge_shards, parse_shard, result_key, select_shard
+from src.utils import file_sha256
+
+
+def test_parse_shard():
+    assert parse_shard("2/8") == (2, 8)
+    for spec in ("8/8", "-1/4", "1/0", "a/b", "3"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_shards_partition_the_corpus(tmp_path):
+    files = []
+    for i in range(20):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(f"document {i}".encode())
+        files.append((path, "bureau"))
+    shards = [select_shard(files, i, 3) for i in range(3)]
+    chosen = [path for shard in shards for path, _, _ in shard]
+    assert sorted(chosen) == sorted(path for path, _ in files)
+    # the partition depends on content only, not on listing order
+    assert select_shard(list(reversed(files)), 1, 3) == list(reversed(shards[1]))
+
+
+def test_result_key_disambiguates_same_name_files(tmp_path):
+    first, second = tmp_path / "a" / "report.pdf", tmp_path / "b" / "report.pdf"
+    for path, body in ((first, b"one"), (second, b"two")):
+        path.parent.mkdir()
+        path.write_bytes(body)
+    owners = {}
+    assert result_key(first, owners) == "report.pdf"
+    assert result_key(second, owners) == f"report.pdf#{file_sha256(str(second))[:12]}"
+    assert result_key(first, owners) == "report.pdf"
+
+
+def write_shard(path, index, count, results, digests, elapsed=10.0):
+    writer = ShardWriter(path, index, count)
+    for name, result in results.items():
+        writer.add(name, digests[name], result, 1.0)
+    writer.write()
+    # pin the wall time so the throughput figures are deterministic
+    data = json.loads(path.read_text())
+    data["shard"]["elapsed_seconds"] = elapsed
+    path.write_text(json.dumps(data))
+    return path
+
+
+def test_merge_dedupes_reports_collisions_and_missing_shards(tmp_path):
+    shard0 = write_shard(tmp_path / "s0.json", 0, 3, {
+        "a.pdf": {"error": "timeout"},
+        "same.pdf": {"gst_sales": [1]},
+    }, {"a.pdf": "aa" * 32, "same.pdf": "11" * 32})
+    shard1 = write_shard(tmp_path / "s1.json", 1, 3, {
+        "a.pdf": {"bureau_parameters": {}},
+        "same.pdf": {"gst_sales": [2]},
+    }, {"a.pdf": "aa" * 32, "same.pdf": "22" * 32}, elapsed=20.0)
+
+    results, report = merge_shards([shard0, shard1])
+    # the same document seen twice keeps the successful result
+    assert results["a.pdf"] == {"bureau_parameters": {}}
+    assert [d["file"] for d in report["duplicates"]] == ["a.pdf"]
+    # different documents with one name are kept side by side
+    assert results["same.pdf"] == {"gst_sales": [1]}
+    assert results["same.pdf#" + "22" * 6] == {"gst_sales": [2]}
+    assert report["name_collisions"][0]["stored_as"] == "same.pdf#" + "22" * 6
+    assert report["missing_shards"] == ["2/3"]
+    assert report["documents"] == 3
+    assert report["errors"] == 0
+    assert report["wall_seconds"] == 20.0
+    assert report["docs_per_sec"] == pytest.approx(3 / 20.0)
@@ -0,0 +1,109 @@
+"""Payment-history parser and DPD aggregates on hand-written CRIF grid text."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dpd import UNKNOWN_DPD, dpd_results, dpd_threshold, month_ordinal, parse_payment_history
+
+HEADER = "Date of Issue: 17-12-2025"
+GRID = "Payment History/Asset Classification:"
+
+
+def account(number: int, loan_type: str, *rows: str) -> str:
+    lines = [f"{number} Account Type: {loan_type} Credit Grantor: XXXX Account #: xxxx As on: 30-11-2025", GRID]
+    return "\n".join(lines + list(rows))
+
+
+def test_cells_dashes_and_masked_dpd():
+    history = parse_payment_history([HEADER + "\n" + account(
+        1, "BUSINESS LOAN UNSECURED",
+        "2025 - - - - - - - - 000/STD 045/SMA XXX/STD -",
+    )])
+    assert history.num_accounts == 1
+    # "-" cells are not months of history
+    assert len(history.records) == 3
+    assert list(history.records["dpd"]) == [0, 45, UNKNOWN_DPD]
+    assert history.max_dpd() == 45
+
+
+def test_masked_sub_standard_counts_as_90_days():
+    history = parse_payment_history([HEADER + "\n" + account(
+        1, "OVERDRAFT",
+        "2025 - - - - - - - - - XXX/SUB 000/DBT -",
+    )])
+    assert list(history.effective_dpd) == [90, 90]
+    assert history.count_accounts(90) == 1
+    assert history.count_months(90) == 2
+
+
+def test_grid_continues_across_a_page_break():
+    page_one = HEADER + "\n" + account(1, "PERSONAL LOAN", "2025 - - - - - - - - - - 030/SMA -")
+    page_two = "\n".join([
+        "Page 2 of 14",
+        "2024 - - - - - - - - - - - 061/SUB",
+        account(2, "PERSONAL LOAN"),
+    ])
+    page_three = "2025 - - - - - - - - - - 000/STD -"
+    history = parse_payment_history([page_one, page_two, page_three])
+    assert history.num_accounts == 2
+    assert list(history.records["account"]) == [0, 0, 1]
+    assert history.count_accounts(60) == 1
+    assert history.count_accounts(30) == 1
+
+
+def test_window_is_measured_from_the_date_of_issue():
+    history = parse_payment_history([HEADER + "\n" + account(
+        1, "PERSONAL LOAN",
+        "2025 035/SMA - - - - - - - - - - -",
+        "2024 - - - - - - - - - - - 040/SMA",
+    )])
+    assert history.reference_month == month_ordinal(2025, 12)
+    # Jan 2025 is the oldest month inside a 12-month window ending Dec 2025; Dec 2024 is outside
+    assert history.count_months(30, months=12) == 1
+    assert history.count_months(30, months=13) == 2
+    assert history.count_months(30) == 2
+
+
+def test_reference_month_falls_back_to_latest_reported_month():
+    history = parse_payment_history([account(1, "PERSONAL LOAN", "2024 - - - - - 031/SMA - - - - - -")])
+    assert history.reference_month == month_ordinal(2024, 6)
+    assert history.count_accounts(30, months=1) == 1
+
+
+def test_loan_type_filter():
+    history = parse_payment_history([HEADER + "\n" + "\n".join([
+        account(1, "PERSONAL LOAN", "2025 - - - - - - - - - - 090/SUB -"),
+        account(2, "Business Loan Secured", "2025 - - - - - - - - - - 095/SUB -"),
+        account(3, "OVERDRAFT", "2025 - - - - - - - - - - 000/STD -"),
+    ])])
+    assert history.count_accounts(90) == 2
+    assert history.count_accounts(90, loan_types=["personal"]) == 1
+    assert history.count_accounts(90, loan_types=["BUSINESS LOAN", "OVERDRAFT"]) == 1
+    assert history.count_accounts(90, loan_types=["GOLD LOAN"]) == 0
+
+
+def test_rows_outside_a_grid_are_ignored():
+    history = parse_payment_history([HEADER + "\n" + "\n".join([
+        "2025 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 090/SUB",
+        "1 Account Type: PERSONAL LOAN Credit Grantor: XXXX Account #: xxxx",
+        "2025 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 000/STD 090/SUB",
+    ])])
+    assert history.num_accounts == 1
+    assert len(history.records) == 0
+
+
+def test_dpd_results_by_parameter_name():
+    history = parse_payment_history([HEADER + "\n" + "\n".join([
+        account(1, "PERSONAL LOAN", "2025 - - - - - - - - - 031/SMA 065/SMA -"),
+        account(2, "PERSONAL LOAN", "2025 - - - - - - - - - - XXX/LSS -"),
+    ])])
+    thresholds = {name: dpd_threshold(name) for name in
+                  ("30+ DPD (Configurable Period)", "60+ DPD (Configurable Period)", "90+ DPD (Configurable Period)")}
+    assert thresholds["60+ DPD (Configurable Period)"] == 60
+    assert dpd_threshold("CIBIL Score") is None
+    assert dpd_results(history, thresholds, months=12) == {
+        "30+ DPD (Configurable Period)": 2,
+        "60+ DPD (Configurable Period)": 2,
+        "90+ DPD (Configurable Period)": 1,
+    }
@@ -0,0 +1,82 @@
+"""Columnar export: typed rows, the errors table, row groups and atomic publishing."""
+import os
+import sys
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.export import ColumnarExporter, bureau_rows, export_results, period_of
+
+RESULTS = {
+    "report.pdf": {"bureau_parameters": {
+        "CIBIL Score": {"value": 627, "source": "Bureau Report", "confidence": 0.9},
+        "Suit Filed": {"value": False, "source": "Bureau Report", "confidence": 0.9},
+        "Remarks": {"value": "none", "source": "Bureau Report", "confidence": 0.75},
+        "Total Amount Overdue": {"value": None, "source": "Not Found", "confidence": 0.0},
+    }},
+    "gstr3b.pdf": {"gst_sales": [
+        {"month": "January 2025", "sales": 1500.5, "source": "GSTR-3B Table 3.1(a)", "confidence": 0.95},
+        {"month": "Sept 2025", "sales": 10, "source": "GSTR-3B Table 3.1(a)", "confidence": 0.95},
+    ]},
+    "broken.pdf": {"error": "PDF has no pages"},
+}
+
+
+def test_period_of():
+    assert period_of("January 2025") == date(2025, 1, 1)
+    assert period_of(" Feb 2024 ") == date(2024, 2, 1)
+    assert period_of("Sept 2025") is None
+    assert period_of(None) is None
+
+
+def test_bureau_values_land_in_the_column_of_their_type():
+    rows = {row["parameter"]: row for row in bureau_rows("r.pdf", RESULTS["report.pdf"]["bureau_parameters"])}
+    assert rows["CIBIL Score"]["value_number"] == 627.0
+    assert rows["Suit Filed"]["value_bool"] is False
+    assert rows["Suit Filed"]["value_number"] is None
+    assert rows["Remarks"]["value_text"] == "none"
+    assert all(rows["Total Amount Overdue"][c] is None for c in ("value_number", "value_bool", "value_text"))
+
+
+def test_parquet_tables_and_errors(tmp_path):
+    exporter = export_results(RESULTS, tmp_path, "parquet", suffix=".shard-0-of-2")
+    assert [p.name for p in exporter.paths] == [
+        "bureau_parameters.shard-0-of-2.parquet", "gst_sales.shard-0-of-2.parquet",
+        "extraction_errors.shard-0-of-2.parquet",
+    ]
+    bureau = pq.read_table(exporter.paths[0])
+    gst = pq.read_table(exporter.paths[1]).to_pylist()
+    errors = pq.read_table(exporter.paths[2]).to_pylist()
+    assert bureau.num_rows == 4
+    assert bureau.schema.field("value_bool").type == pa.bool_()
+    assert [row["period"] for row in gst] == [date(2025, 1, 1), None]
+    assert errors == [{"file": "broken.pdf", "error": "PDF has no pages"}]
+    assert exporter.skipped == 1
+
+
+@pytest.mark.parametrize("row_group_rows, batches", [(4, 3), (100, 1)])
+def test_arrow_format_and_row_groups(tmp_path, row_group_rows, batches):
+    with ColumnarExporter(tmp_path, "arrow", row_group_rows=row_group_rows) as exporter:
+        for name in ("a.pdf", "b.pdf", "c.pdf"):
+            exporter.add(name, RESULTS["report.pdf"])
+    reader = ipc.open_file(pa.memory_map(str(exporter.paths[0])))
+    assert reader.num_record_batches == batches
+    assert reader.read_all().num_rows == 12
+
+
+def test_failed_run_publishes_nothing(tmp_path):
+    with pytest.raises(RuntimeError):
+        with ColumnarExporter(tmp_path) as exporter:
+            exporter.add("report.pdf", RESULTS["report.pdf"])
+            raise RuntimeError("interrupted")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        ColumnarExporter(tmp_path, "csv")
@@ -1,210 +1,213 @@
 import sys
 import os
+import argparse
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
-from typing import Dict, List, Any
-from collections import defaultdict
+
+import chromadb
+from typing import Dict, Any, Optional, Tuple
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import EXCEL_PARAM_FILE, BUREAU_REPORTS_DIR, GST_RETURNS_DIR
-from src.llm import LLMEngine
+from src.config import (
+    EXCEL_PARAM_FILE, BUREAU_REPORTS_DIR, GST_RETURNS_DIR, LLM_REPLAY_FILE, DPD_WINDOW_MONTHS, DPD_LOAN_TYPES,
+)
+from src.llm import LLMEngine, ReplayMiss
+from src.rag import RAGEngine
 from src.extractors import BureauExtractor, GstExtractor
+from bench.stats import summarize
 
+GOLDEN_FILE = Path(__file__).parent / "golden_values.json"
+# the DPD golden values were computed with the default window and no loan-type filter
+GOLDEN_DPD_WINDOW_MONTHS = 12
+MONTH_YEAR = re.compile(r"([A-Za-z]{3})[A-Za-z]*\W*(\d{4})")
 
-class ExtractionTester:
-    def __init__(self):
-        self.llm = LLMEngine()
-        self.bureau_extractor = BureauExtractor(str(EXCEL_PARAM_FILE), self.llm)
-        self.gst_extractor = GstExtractor(self.llm)
-
-    def test_bureau_consistency(self, pdf_path: str, num_runs: int = 5) -> Dict[str, Any]:
-        print(f"\n{'='*60}")
-        print(f"Testing Bureau Report Consistency: {Path(pdf_path).name}")
-        print(f"Number of runs: {num_runs}")
-        print(f"{'='*60}\n")
-
-        results = []
-
-        for i in range(num_runs):
-            print(f"Run {i+1}/{num_runs}...", end=" ")
-            try:
-                extracted = self.bureau_extractor.extract(pdf_path)
-                results.append({
-                    k: v.model_dump() for k, v in extracted.items()
-                })
-                print("✓")
-            except Exception as e:
-                print(f"✗ Error: {e}")
-
-        if not results:
-            return {"error": "No successful runs"}
-
-        consistency_report = {}
-        for param_name in results[0].keys():
-            values = [r[param_name]['value'] for r in results]
-            unique_values = set(str(v) for v in values)
-
-            consistency_report[param_name] = {
-                "unique_values": len(unique_values),
-                "values": list(unique_values),
-                "consistency_score": 1.0 if len(unique_values) == 1 else 0.0,
-                "most_common": max(set(values), key=values.count) if values else None
-            }
-
-        consistency_scores = [v['consistency_score'] for v in consistency_report.values()]
-        overall_consistency = sum(consistency_scores) / len(consistency_scores) if consistency_scores else 0.0
-
-        return {
-            "num_runs": num_runs,
-            "successful_runs": len(results),
-            "overall_consistency": round(overall_consistency, 2),
-            "parameter_consistency": consistency_report,
-            "sample_result": results[0]
-        }
-
-    def test_gst_consistency(self, pdf_path: str, num_runs: int = 5) -> Dict[str, Any]:
-        print(f"\n{'='*60}")
-        print(f"Testing GST Return Consistency: {Path(pdf_path).name}")
-        print(f"Number of runs: {num_runs}")
-        print(f"{'='*60}\n")
-
-        results = []
-
-        for i in range(num_runs):
-            print(f"Run {i+1}/{num_runs}...", end=" ")
-            try:
-                extracted = self.gst_extractor.extract(pdf_path)
-                results.append([item.model_dump() for item in extracted])
-                print("✓")
-            except Exception as e:
-                print(f"✗ Error: {e}")
-
-        if not results:
-            return {"error": "No successful runs"}
-
-        lengths = [len(r) for r in results]
-        length_consistency = 1.0 if len(set(lengths)) == 1 else 0.0
 
-        if length_consistency == 1.0 and len(results[0]) > 0:
-            sales_consistency = []
-            for idx in range(len(results[0])):
-                sales_values = [r[idx]['sales'] for r in results]
-                unique_sales = set(sales_values)
-                sales_consistency.append(1.0 if len(unique_sales) == 1 else 0.0)
+def values_match(expected: Any, extracted: Any) -> bool:
+    if isinstance(expected, str):
+        want, got = MONTH_YEAR.search(expected), MONTH_YEAR.search(str(extracted or ""))
+        if want and got:
+            return (want.group(1).lower(), want.group(2)) == (got.group(1).lower(), got.group(2))
+        return str(extracted).strip().lower() == expected.strip().lower()
+    if isinstance(expected, bool) or expected is None:
+        return extracted == expected
+    if isinstance(extracted, bool) or not isinstance(extracted, (int, float)):
+        return False
+    return math.isclose(extracted, expected, rel_tol=1e-9, abs_tol=0.01)
 
-            overall_consistency = sum(sales_consistency) / len(sales_consistency)
-        else:
-            overall_consistency = 0.0
 
-        return {
-            "num_runs": num_runs,
-            "successful_runs": len(results),
-            "overall_consistency": round(overall_consistency, 2),
-            "length_consistency": length_consistency,
-            "sample_result": results[0] if results else []
-        }
-
-    def test_accuracy_against_expected(
-        self,
-        pdf_path: str,
-        expected_values: Dict[str, Any],
-        doc_type: str = "bureau"
-    ) -> Dict[str, Any]:
-        print(f"\n{'='*60}")
-        print(f"Testing Accuracy: {Path(pdf_path).name}")
-        print(f"{'='*60}\n")
-
-        if doc_type == "bureau":
-            extracted = self.bureau_extractor.extract(pdf_path)
-            extracted_dict = {k: v.value for k, v in extracted.items()}
-        else:
-            extracted = self.gst_extractor.extract(pdf_path)
-            extracted_dict = {f"month_{i}": item.sales for i, item in enumerate(extracted)}
-
-        accuracy_report = {}
-        for param, expected_val in expected_values.items():
-            extracted_val = extracted_dict.get(param)
-
-            match = extracted_val == expected_val
-            accuracy_report[param] = {
-                "expected": expected_val,
-                "extracted": extracted_val,
-                "match": match,
-                "accuracy": 1.0 if match else 0.0
+class ExtractionTester:
+    """Golden-set harness: accuracy, consistency and latency in one parallel run.
+
+    Documents x repetitions run on a thread pool, each worker with its own
+    extractors (sharing the embedding model and LLM engine). With
+    replay_mode="replay" the LLM answers come from recorded responses, so a
+    full run takes seconds and needs no Ollama; a prompt without a recording
+    is reported as a replay miss for the parameters it asked for.
+    """
+
+    def __init__(self, workers: int = 4, replay_mode: str = "off"):
+        self.workers = workers
+        self.llm = LLMEngine(replay_mode=replay_mode)
+        self.embeddings = RAGEngine().embeddings
+        self.client = chromadb.EphemeralClient()
+        self._local = threading.local()
+
+    def _extractors(self) -> Tuple[BureauExtractor, GstExtractor]:
+        if not hasattr(self._local, "bureau"):
+            rag = RAGEngine(self.embeddings, collection_name=f"golden-{threading.get_ident()}",
+                            client=self.client)
+            self._local.bureau = BureauExtractor(str(EXCEL_PARAM_FILE), self.llm, rag=rag)
+            self._local.gst = GstExtractor(self.llm, rag=rag)
+        return self._local.bureau, self._local.gst
+
+    def _run_once(self, doc_type: str, pdf_path: Path) -> Tuple[Dict[str, Any], float, Optional[ReplayMiss]]:
+        bureau, gst = self._extractors()
+        start = time.perf_counter()
+        miss = None
+        try:
+            if doc_type == "bureau":
+                values = {k: v.value for k, v in bureau.extract(str(pdf_path)).items()}
+            else:
+                sales = gst.extract(str(pdf_path))
+                values = {"month": sales[0].month, "sales": sales[0].sales} if sales else {}
+        except ReplayMiss as e:
+            miss = e
+            values = {}
+        except Exception as e:
+            print(f"✗ {pdf_path.name}: {e}")
+            values = {}
+        return values, time.perf_counter() - start, miss
+
+    def run_golden(self, golden: Dict[str, Dict[str, Dict[str, Any]]], repeats: int = 3) -> Dict[str, Any]:
+        directories = {"bureau": BUREAU_REPORTS_DIR, "gst": GST_RETURNS_DIR}
+        tasks = []
+        for doc_type, documents in golden.items():
+            for name in documents:
+                path = directories[doc_type] / name
+                if not path.exists():
+                    print(f"Skipping missing golden document {path}")
+                    continue
+                tasks.extend((doc_type, path) for _ in range(repeats))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            outcomes = list(pool.map(lambda task: self._run_once(*task), tasks))
+        elapsed = time.perf_counter() - started
+
+        runs = defaultdict(list)
+        latencies = defaultdict(list)
+        misses = {}
+        for (doc_type, path), (values, seconds, miss) in zip(tasks, outcomes):
+            runs[(doc_type, path.name)].append(values)
+            latencies[doc_type].append(seconds)
+            if miss:
+                misses[(path.name, miss.key)] = {
+                    "document": path.name,
+                    "model": miss.model_name,
+                    "parameters": list(miss.parameters),
+                    "prompt_key": miss.key,
+                }
+
+        parameters = defaultdict(lambda: {"runs": 0, "correct": 0, "consistent": 0})
+        documents = {}
+        for (doc_type, name), results in runs.items():
+            report = {}
+            for param, expected in golden[doc_type][name].items():
+                values = [r.get(param) for r in results]
+                correct = sum(values_match(expected, v) for v in values)
+                _, most_common = Counter(json.dumps(v, sort_keys=True) for v in values).most_common(1)[0]
+                report[param] = {
+                    "expected": expected,
+                    "extracted": values,
+                    "accuracy": round(correct / len(values), 2),
+                    "consistency": round(most_common / len(values), 2),
+                }
+                totals = parameters[f"{doc_type}: {param}"]
+                totals["runs"] += len(values)
+                totals["correct"] += correct
+                totals["consistent"] += most_common
+            documents[name] = report
+
+        per_parameter = {
+            param: {
+                "accuracy": round(t["correct"] / t["runs"], 3),
+                "consistency": round(t["consistent"] / t["runs"], 3),
+                "runs": t["runs"],
             }
-
-        accuracy_scores = [v['accuracy'] for v in accuracy_report.values()]
-        overall_accuracy = sum(accuracy_scores) / len(accuracy_scores) if accuracy_scores else 0.0
-
+            for param, t in sorted(parameters.items())
+        }
+        correct = sum(t["correct"] for t in parameters.values())
+        total = sum(t["runs"] for t in parameters.values())
         return {
-            "overall_accuracy": round(overall_accuracy, 2),
-            "total_parameters": len(expected_values),
-            "correct_parameters": sum(1 for v in accuracy_report.values() if v['match']),
-            "parameter_accuracy": accuracy_report
+            "repeats": repeats,
+            "workers": self.workers,
+            "elapsed_seconds": round(elapsed, 3),
+            "overall_accuracy": round(correct / total, 3) if total else 0.0,
+            "parameters": per_parameter,
+            "latency_seconds": {doc_type: summarize(values) for doc_type, values in latencies.items()},
+            "replay_misses": list(misses.values()),
+            "documents": documents,
         }
 
 
-def run_basic_tests():
-    tester = ExtractionTester()
-
-    bureau_files = list(BUREAU_REPORTS_DIR.glob("*.pdf"))
-    gst_files = list(GST_RETURNS_DIR.glob("*.pdf"))
+def run_golden_tests():
+    parser = argparse.ArgumentParser(description="Golden-set accuracy, consistency and latency check")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per document")
+    parser.add_argument("--workers", type=int, default=4, help="Documents extracted in parallel")
+    parser.add_argument("--mode", choices=["auto", "live", "record", "replay"], default="auto",
+                        help="auto: replay the recording at LLM_REPLAY_FILE, and fail if there is none")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Exit non-zero below this accuracy")
+    args = parser.parse_args()
+
+    mode = args.mode
+    if mode == "auto":
+        if not LLM_REPLAY_FILE.exists():
+            sys.exit(f"No recorded LLM responses at {LLM_REPLAY_FILE}. None is shipped with the repository: "
+                     f"record one against a live Ollama with --mode record (or point LLM_REPLAY_FILE at one), "
+                     f"or use --mode live.")
+        mode = "replay"
+    replay_mode = "off" if mode == "live" else mode
+    if DPD_WINDOW_MONTHS != GOLDEN_DPD_WINDOW_MONTHS or DPD_LOAN_TYPES:
+        print(f"Warning: DPD golden values assume DPD_WINDOW_MONTHS={GOLDEN_DPD_WINDOW_MONTHS} "
+              f"and no DPD_LOAN_TYPES filter")
 
     print("\n" + "="*60)
-    print("DOCUMENT EXTRACTION - TEST SUITE")
+    print(f"DOCUMENT EXTRACTION - GOLDEN SET ({mode}, {args.repeats} repeats, {args.workers} workers)")
     print("="*60)
 
-    results = {
-        "bureau_tests": [],
-        "gst_tests": []
-    }
-
-    if bureau_files:
-        print(f"\nFound {len(bureau_files)} Bureau Report(s)")
-        test_file = bureau_files[0]
-        consistency = tester.test_bureau_consistency(str(test_file), num_runs=3)
-        results["bureau_tests"].append({
-            "file": test_file.name,
-            "test_type": "consistency",
-            "result": consistency
-        })
-
-    if gst_files:
-        print(f"\nFound {len(gst_files)} GST Return(s)")
-        test_file = gst_files[0]
-        consistency = tester.test_gst_consistency(str(test_file), num_runs=3)
-        results["gst_tests"].append({
-            "file": test_file.name,
-            "test_type": "consistency",
-            "result": consistency
-        })
+    golden = json.loads(GOLDEN_FILE.read_text())
+    results = ExtractionTester(workers=args.workers, replay_mode=replay_mode).run_golden(golden, args.repeats)
 
     output_file = Path(__file__).parent / "test_results.json"
     with open(output_file, "w") as f:
-        json.dump(results, f, indent=2)
-
-    print(f"\n{'='*60}")
-    print(f"Test results saved to: {output_file}")
-    print(f"{'='*60}\n")
+        json.dump(results, f, indent=2, default=str)
 
-    print("\nTEST SUMMARY:")
+    print("\nPARAMETER SUMMARY:")
     print("-" * 60)
+    for param, stats in results["parameters"].items():
+        print(f"{param:<32} accuracy {stats['accuracy']:.2f}  consistency {stats['consistency']:.2f}")
+    print("-" * 60)
+    for doc_type, stats in results["latency_seconds"].items():
+        print(f"{doc_type:<8} latency p50 {stats['p50']:.2f}s  p90 {stats['p90']:.2f}s  p99 {stats['p99']:.2f}s")
+    print(f"Overall accuracy: {results['overall_accuracy']:.3f} in {results['elapsed_seconds']:.1f}s")
+    print(f"\nTest results saved to: {output_file}\n")
 
-    if results["bureau_tests"]:
-        for test in results["bureau_tests"]:
-            if "overall_consistency" in test["result"]:
-                print(f"Bureau Report: {test['file']}")
-                print(f"  Consistency Score: {test['result']['overall_consistency']}")
-
-    if results["gst_tests"]:
-        for test in results["gst_tests"]:
-            if "overall_consistency" in test["result"]:
-                print(f"GST Return: {test['file']}")
-                print(f"  Consistency Score: {test['result']['overall_consistency']}")
-
-    print()
+    if results["replay_misses"]:
+        print("REPLAY MISSES (prompt or retrieval changed since recording; re-record with --mode record):")
+        for miss in results["replay_misses"]:
+            print(f"  ✗ {miss['document']}: {', '.join(miss['parameters']) or 'unknown parameters'} "
+                  f"[{miss['model']} {miss['prompt_key'][:12]}]")
+        sys.exit(1)
+    if args.min_accuracy is not None and results["overall_accuracy"] < args.min_accuracy:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    run_basic_tests()
+    run_golden_tests()
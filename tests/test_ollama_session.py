@@ -0,0 +1,35 @@
+"""Context sizing: power-of-two buckets and the per-model high-water num_ctx."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ollama_session import ModelSession, context_size
+
+
+class RecordingLLM:
+    def __init__(self):
+        self.num_ctx = []
+
+    def invoke(self, prompt, num_ctx, **kwargs):
+        self.num_ctx.append(num_ctx)
+        return "{}"
+
+
+def test_context_size_buckets():
+    assert context_size("x" * 100, minimum=2048, maximum=16384, reserve=512, chars_per_token=3.0) == 2048
+    assert context_size("x" * 6000, minimum=2048, maximum=16384, reserve=512, chars_per_token=3.0) == 4096
+    assert context_size("x" * 20000, minimum=2048, maximum=16384, reserve=512, chars_per_token=3.0) == 8192
+    assert context_size("x" * 10 ** 6, minimum=2048, maximum=16384, reserve=512, chars_per_token=3.0) == 16384
+
+
+def test_num_ctx_only_grows_so_mixed_traffic_does_not_reload():
+    session = ModelSession("test-model", residency_ttl=3600)
+    session.llm = RecordingLLM()
+    session._set_residency("warm")
+    short, long = "x" * 100, "x" * 20000
+
+    for prompt in (short, long, short, long, short):
+        session.invoke(prompt)
+    assert session.llm.num_ctx == [context_size(short)] + [context_size(long)] * 4
+    assert session.num_ctx == context_size(long)
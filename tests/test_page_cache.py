@@ -0,0 +1,106 @@
+"""Page text cache file format: round trip, empty pages, corrupt and partial files."""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.page_cache import FOOTER, MAGIC, CachedPages, PageTextCache, PageWriter
+
+
+def write_pages(path, pages):
+    writer = PageWriter(path)
+    for text in pages:
+        writer.add(text)
+    writer.commit()
+    return path
+
+
+def test_round_trip_keeps_order_and_empty_pages(tmp_path):
+    pages = ["first page", "", None, "ünïcödé ₹ 1,500\nsecond line" * 50]
+    path = write_pages(tmp_path / "doc.pages", pages)
+    with CachedPages(path) as cached:
+        assert len(cached) == 4
+        assert [cached.text(n) for n in range(1, 5)] == ["first page", "", "", pages[3]]
+
+
+def test_file_layout_starts_and_ends_with_magic(tmp_path):
+    data = write_pages(tmp_path / "doc.pages", ["a", "b"]).read_bytes()
+    assert data[:len(MAGIC)] == MAGIC
+    index_offset, count, magic = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+    assert (count, magic) == (2, MAGIC)
+    assert index_offset < len(data) - FOOTER.size
+
+
+def test_uncommitted_writer_publishes_nothing(tmp_path):
+    path = tmp_path / "doc.pages"
+    writer = PageWriter(path)
+    writer.add("partial")
+    writer.discard()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_hit_miss_and_corrupt_file(tmp_path):
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"%PDF-1.4 not really a pdf")
+    cache = PageTextCache(tmp_path / "cache", enabled=True)
+    assert cache.open(str(pdf)) is None
+
+    writer = cache.writer(str(pdf))
+    writer.add("page one")
+    writer.commit()
+    with cache.open(str(pdf)) as cached:
+        assert cached.text(1) == "page one"
+
+    cache.path_for(str(pdf)).write_bytes(b"truncated")
+    assert cache.open(str(pdf)) is None
+
+
+def test_changed_file_misses(tmp_path):
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"version one")
+    cache = PageTextCache(tmp_path / "cache", enabled=True)
+    writer = cache.writer(str(pdf))
+    writer.add("old text")
+    writer.commit()
+
+    pdf.write_bytes(b"version two, longer")
+    assert cache.open(str(pdf)) is None
+
+
+def test_disabled_cache_neither_reads_nor_writes(tmp_path):
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(b"data")
+    cache = PageTextCache(tmp_path / "cache", enabled=False)
+    assert cache.writer(str(pdf)) is None
+    assert cache.open(str(pdf)) is None
+    assert not (tmp_path / "cache").exists()
+
+
+def cache_pdf(cache, pdf, body, text):
+    pdf.write_bytes(body)
+    writer = cache.writer(str(pdf))
+    writer.add(text)
+    writer.commit()
+    return cache.path_for(str(pdf))
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = PageTextCache(tmp_path / "cache", enabled=True, max_mb=0)
+    first = cache_pdf(cache, tmp_path / "a.pdf", b"a", "x" * 1000)
+    second = cache_pdf(cache, tmp_path / "b.pdf", b"b", "y" * 1000)
+    os.utime(first, ns=(1, 1))
+    os.utime(second, ns=(2, 2))
+    with cache.open(str(tmp_path / "a.pdf")):
+        pass  # a hit makes "a" the most recently used
+
+    cache.max_bytes = first.stat().st_size + 1
+    assert cache.evict() == 1
+    assert first.exists() and not second.exists()
+
+
+def test_eviction_disabled_keeps_everything(tmp_path):
+    cache = PageTextCache(tmp_path / "cache", enabled=True, max_mb=0)
+    for name in ("a", "b", "c"):
+        cache_pdf(cache, tmp_path / f"{name}.pdf", name.encode(), name * 100)
+    assert cache.evict() == 0
+    assert len(list((tmp_path / "cache").glob("*.pages"))) == 3
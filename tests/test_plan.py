@@ -0,0 +1,69 @@
+"""Type coercion and scoring of raw LLM values against plan parameters."""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.plan import PlanParameter, infer_value_type
+
+
+def parameter(value_type: str, name: str = "Parameter") -> PlanParameter:
+    return PlanParameter(key=name.lower(), name=name, description="", value_type=value_type,
+                         prompt_line="", format_line="")
+
+
+def test_infer_value_type():
+    assert infer_value_type("Suit Filed", "Whether any suit is filed") == "flag"
+    assert infer_value_type("CIBIL Score", "Bureau score") == "score"
+    assert infer_value_type("Total Amount Overdue", "Sum overdue") == "amount"
+    assert infer_value_type("Credit Inquiries", "Enquiries in the last 6 months") == "count"
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (0, False), (1, True), ("Yes", True), (" absent ", False), ("N", False),
+])
+def test_coerce_flag(value, expected):
+    assert parameter("flag").coerce(value) is expected
+
+
+@pytest.mark.parametrize("value_type, value", [
+    ("flag", "maybe"), ("flag", 2),
+    ("score", 250), ("score", 901), ("score", True),
+    ("count", 2.5), ("count", -1), ("count", "3"),
+    ("amount", -10.0),
+])
+def test_coerce_rejects(value_type, value):
+    with pytest.raises(ValueError):
+        parameter(value_type).coerce(value)
+
+
+def test_coerce_numbers():
+    assert parameter("score").coerce(627.0) == 627
+    assert isinstance(parameter("count").coerce(3.0), int)
+    assert parameter("amount").coerce(1500) == 1500.0
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (True, (True, 0.90)),
+    ("true", (True, 0.90)),
+    (" Yes ", (True, 0.90)),
+    ("absent", (False, 0.90)),
+])
+def test_evaluate_flag_words_are_as_confident_as_booleans(raw, expected):
+    value, confidence, source = parameter("flag").evaluate(raw)
+    assert (value, confidence) == expected
+    assert source == "Bureau Report - RAG Analysis"
+
+
+def test_evaluate_numbers_and_text():
+    assert parameter("score").evaluate(627)[:2] == (627, 0.90)
+    assert parameter("amount").evaluate("Rs. 1,500")[:2] == (1500.0, 0.85)
+    assert parameter("count").evaluate(" N/A ") == (None, 0.0, "Not Found")
+    assert parameter("count").evaluate(None) == (None, 0.0, "Not Found")
+
+
+def test_evaluate_out_of_range_fails_validation():
+    assert parameter("score").evaluate(1200) == (None, 0.0, "Failed Validation")
+    assert parameter("flag").evaluate("probably not") == (None, 0.0, "Failed Validation")
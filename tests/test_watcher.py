@@ -0,0 +1,132 @@
+"""FolderWatcher: settling, change detection, retry backoff and interrupted handlers."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.watcher import FolderWatcher
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    directory = tmp_path / "inbox"
+    directory.mkdir()
+    return directory
+
+
+def make_watcher(inbox, **kwargs):
+    kwargs.setdefault("settle_seconds", 10)
+    return FolderWatcher({inbox: "bureau"}, state_path=inbox.parent / "state.json", **kwargs)
+
+
+def process(watcher, path, ok=True):
+    watcher.mark_done(path, watcher.snapshot(path), ok)
+
+
+def test_new_file_is_ready_once_settled_and_only_once(inbox):
+    watcher = make_watcher(inbox)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"one")
+    (inbox / "notes.txt").write_text("ignored")
+
+    assert watcher.scan(now=0) == []
+    assert watcher.scan(now=5) == []
+    assert watcher.scan(now=10) == [(pdf, "bureau")]
+    process(watcher, pdf)
+    assert watcher.scan(now=20) == []
+    # state survives a restart
+    assert make_watcher(inbox).scan(now=0) == []
+
+
+def test_write_in_progress_restarts_the_settle_timer(inbox):
+    watcher = make_watcher(inbox)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"partial")
+    watcher.scan(now=0)
+    pdf.write_bytes(b"partial upload, now complete")
+    assert watcher.scan(now=10) == []
+    assert watcher.scan(now=20) == [(pdf, "bureau")]
+
+
+def test_touched_file_is_skipped_changed_file_is_not(inbox):
+    watcher = make_watcher(inbox)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"one")
+    watcher.scan(now=0)
+    watcher.scan(now=10)
+    process(watcher, pdf)
+
+    os.utime(pdf, ns=(1, 1))
+    assert watcher.scan(now=20) == []
+    assert watcher.scan(now=30) == []
+    assert watcher.state[str(pdf)]["mtime_ns"] == 1
+
+    pdf.write_bytes(b"two")
+    watcher.scan(now=40)
+    assert watcher.scan(now=50) == [(pdf, "bureau")]
+
+
+def test_failed_file_is_retried_with_backoff(inbox):
+    watcher = make_watcher(inbox, retry_seconds=60, retry_max_seconds=100)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"one")
+    watcher.scan(now=0)
+    watcher.scan(now=10)
+
+    process(watcher, pdf, ok=False)
+    entry = watcher.state[str(pdf)]
+    assert entry["failures"] == 1
+    assert watcher.scan(now=20) == []
+
+    entry["retry_at"] = 0
+    assert watcher.scan(now=30) == [(pdf, "bureau")]
+    before = time.time()
+    process(watcher, pdf, ok=False)
+    entry = watcher.state[str(pdf)]
+    assert entry["failures"] == 2
+    # 60s doubled, capped at retry_max_seconds
+    assert before + 100 <= entry["retry_at"] <= time.time() + 100
+
+    process(watcher, pdf, ok=True)
+    assert "failures" not in watcher.state[str(pdf)]
+    assert watcher.scan(now=40) == []
+
+
+def run_once(watcher, handler):
+    stop = threading.Event()
+
+    def wrapped(path, dtype):
+        stop.set()
+        return handler(path, dtype)
+
+    watcher.run(wrapped, stop)
+
+
+def test_run_records_exceptions_as_failures(inbox):
+    watcher = make_watcher(inbox, settle_seconds=0, poll_seconds=0.01)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"one")
+
+    def broken(path, dtype):
+        raise RuntimeError("model server down")
+
+    run_once(watcher, broken)
+    assert watcher.state[str(pdf)]["ok"] is False
+
+
+def test_run_does_not_record_interrupted_files(inbox):
+    watcher = make_watcher(inbox, settle_seconds=0, poll_seconds=0.01)
+    pdf = inbox / "a.pdf"
+    pdf.write_bytes(b"one")
+
+    def interrupted(path, dtype):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run_once(watcher, interrupted)
+    assert str(pdf) not in watcher.state
+    assert make_watcher(inbox, settle_seconds=0).state == {}